@@ -0,0 +1,92 @@
+from typing import Optional
+from typing import Mapping
+from typing import Dict
+from typing import List
+from typing import Any
+from snapshot import AccountSnapshot
+from snapshot import ACCOUNT_COLUMNS
+from db import ConnectionPool
+import os
+
+
+# Batch settings, overridable through the environment
+MAX_BATCH_SIZE = int(os.environ.get('SALES_BATCH_MAX_IDS', '500'))
+
+# IDs bound per IN (...) query, below SQLite's historical 999-variable limit
+BATCH_CHUNK_SIZE = 500
+
+
+def parse_batch_ids(data: Any, max_size: int = MAX_BATCH_SIZE) -> List[str]:
+    """
+    Validates a batch request body of the form {"ids": ["...", ...]}.
+
+    Args:
+        data (Any): The parsed JSON body.
+        max_size (int): Most distinct IDs allowed in one request.
+
+    Returns:
+        List[str]: The distinct IDs, in request order.
+
+    Raises:
+        ValueError: If the body is not a list of string IDs.
+        OverflowError: If there are more than `max_size` distinct IDs.
+    """
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(account_id, str) for account_id in ids):
+        raise ValueError('ids must be a list of account ID strings')
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > max_size:
+        raise OverflowError(f'At most {max_size} ids can be requested at once')
+    return ids
+
+
+def fetch_accounts_by_ids(pool: ConnectionPool, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches accounts with one `IN (...)` query per BATCH_CHUNK_SIZE IDs, all on a single pooled connection.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The accounts found, by ID.
+    """
+    found = {}
+    with pool.connection() as conn:
+        for start in range(0, len(ids), BATCH_CHUNK_SIZE):
+            chunk = ids[start:start + BATCH_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            sql = f'SELECT {", ".join(ACCOUNT_COLUMNS)} FROM accounts WHERE id IN ({placeholders})'
+            for row in conn.execute(sql, chunk):
+                found[row['id']] = dict(row)
+    return found
+
+
+def batch_result(ids: List[str], found: Mapping[str, Optional[Dict[str, Any]]]) -> Dict[str, List[Any]]:
+    """
+    Splits requested IDs into the found `accounts` and the `missing` IDs, both in request order.
+    """
+    return {
+        'accounts': [found[account_id] for account_id in ids if found.get(account_id)],
+        'missing': [account_id for account_id in ids if not found.get(account_id)],
+    }
+
+
+def get_accounts_by_ids(snapshot: AccountSnapshot, pool: ConnectionPool,
+                        ids: List[str]) -> Dict[str, List[Any]]:
+    """
+    Resolves many account IDs at once.
+
+    IDs are looked up in the snapshot when it is loaded; otherwise they are fetched
+    with `fetch_accounts_by_ids`.
+
+    Args:
+        snapshot (AccountSnapshot): In-memory accounts, if available.
+        pool (ConnectionPool): Pool used when there is no snapshot.
+        ids (List[str]): Distinct account IDs.
+
+    Returns:
+        Dict[str, List[Any]]: The found `accounts` and the `missing` IDs, both in request order.
+    """
+    data = snapshot.current()
+    if data is not None:
+        found: Dict[str, Optional[Dict[str, Any]]] = {account_id: data.by_id.get(account_id) for account_id in ids}
+    else:
+        found = fetch_accounts_by_ids(pool, ids)
+    return batch_result(ids, found)
@@ -0,0 +1,123 @@
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Any
+from search import find_accounts_by_exact_name
+from search import search_accounts_by_name
+from snapshot import AccountSnapshot
+from batch import get_accounts_by_ids
+from shards import ShardedAccounts
+from db import ConnectionPool
+import os
+
+
+# Context settings, overridable through the environment
+DEFAULT_CONTEXT_MATCHES = int(os.environ.get('SALES_CONTEXT_DEFAULT_MATCHES', '5'))
+MAX_CONTEXT_MATCHES = int(os.environ.get('SALES_CONTEXT_MAX_MATCHES', '50'))
+MAX_CONTEXT_QUERIES = int(os.environ.get('SALES_CONTEXT_MAX_QUERIES', '50'))
+
+# Base URL of each account page, as returned by /api/accounts/url
+ACCOUNT_URL_BASES = {
+    'portfolio': 'https://sales.com/portfolio/accounts/',
+    'sales': 'https://sales.com/sales/accounts/',
+    'activity': 'https://sales.com/activity/accounts/',
+}
+
+
+def account_urls(account_id: str) -> Dict[str, str]:
+    """
+    Builds the portfolio, sales and activity URLs of an account.
+    """
+    return {account_type: f'{base_url}{account_id}' for account_type, base_url in ACCOUNT_URL_BASES.items()}
+
+
+def parse_context_queries(data: Any, max_size: int = MAX_CONTEXT_QUERIES) -> List[str]:
+    """
+    Validates a batch context request body of the form {"queries": ["...", ...]}.
+
+    Args:
+        data (Any): The parsed JSON body.
+        max_size (int): Most distinct queries allowed in one request.
+
+    Returns:
+        List[str]: The distinct, non-empty queries, in request order.
+
+    Raises:
+        ValueError: If the body is not a list of non-empty strings.
+        OverflowError: If there are more than `max_size` distinct queries.
+    """
+    queries = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not all(isinstance(query, str) and query.strip() for query in queries):
+        raise ValueError('queries must be a list of account IDs or names')
+    queries = list(dict.fromkeys(query.strip() for query in queries))
+    if len(queries) > max_size:
+        raise OverflowError(f'At most {max_size} queries can be resolved at once')
+    return queries
+
+
+def _with_urls(account: Dict[str, Any]) -> Dict[str, Any]:
+    return {**account, 'urls': account_urls(account['id'])}
+
+
+def _context(query: str, match: str, accounts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {'query': query, 'match': match, 'accounts': [_with_urls(account) for account in accounts]}
+
+
+def resolve_by_name(pool: ConnectionPool, query: str, limit: int,
+                    shards: Optional[ShardedAccounts] = None) -> List[Dict[str, Any]]:
+    """
+    Finds up to `limit` accounts whose name contains `query`, exact (case-insensitive) names first.
+
+    Exact names are looked up on their own, so they are never crowded out by earlier
+    substring matches; the substring matches then fill the remaining places.
+    """
+    if shards is not None:
+        accounts = shards.exact(query, limit)
+    else:
+        accounts = [dict(row) for row in find_accounts_by_exact_name(pool, query, limit)]
+    if len(accounts) < limit:
+        # Every exact name is also a substring match, so this many always leaves enough new ones
+        count = limit + len(accounts)
+        if shards is not None:
+            matches = shards.search(query, count)
+        else:
+            matches = [dict(row) for row in search_accounts_by_name(pool, query, count)]
+        seen = {account['id'] for account in accounts}
+        accounts += [account for account in matches if account['id'] not in seen][:limit - len(accounts)]
+    return accounts
+
+
+def account_contexts(snapshot: AccountSnapshot, pool: ConnectionPool, queries: List[str],
+                     limit: int = DEFAULT_CONTEXT_MATCHES,
+                     shards: Optional[ShardedAccounts] = None) -> List[Dict[str, Any]]:
+    """
+    Resolves account IDs or names to their records and URLs, in one pass for all queries.
+
+    Every query is first tried as an account ID, all at once through the batch lookup.
+    The rest are searched as names.
+
+    Args:
+        snapshot (AccountSnapshot): In-memory accounts, if available.
+        pool (ConnectionPool): Pool for the queries the snapshot cannot answer.
+        queries (List[str]): Distinct account IDs or (partial) names.
+        limit (int): Most accounts returned per name.
+        shards (Optional[ShardedAccounts]): Sharded storage to query instead of `pool`, if configured.
+
+    Returns:
+        List[Dict[str, Any]]: Per query, in order: the `query`, how it matched (`id`, `name`
+            or `none`) and the matching `accounts`, each with its `urls`.
+    """
+    if shards is not None:
+        found = shards.get_many(queries)
+    else:
+        found = get_accounts_by_ids(snapshot, pool, queries)
+    by_id = {account['id']: account for account in found['accounts']}
+    contexts = []
+    for query in queries:
+        account: Optional[Dict[str, Any]] = by_id.get(query)
+        if account is not None:
+            contexts.append(_context(query, 'id', [account]))
+            continue
+        accounts = resolve_by_name(pool, query, limit, shards)
+        contexts.append(_context(query, 'name' if accounts else 'none', accounts))
+    return contexts
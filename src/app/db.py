@@ -0,0 +1,410 @@
+from contextlib import contextmanager
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import TypeVar
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+import threading
+import hashlib
+import logging
+import sqlite3
+import queue
+import time
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# Pool settings, overridable through the environment (e.g. Cloud Function env vars)
+DEFAULT_POOL_SIZE = int(os.environ.get('SALES_DB_POOL_SIZE', '4'))
+DEFAULT_POOL_TIMEOUT = float(os.environ.get('SALES_DB_POOL_TIMEOUT', '5.0'))
+DEFAULT_CACHED_STATEMENTS = int(os.environ.get('SALES_DB_CACHED_STATEMENTS', '128'))
+DEFAULT_MMAP_SIZE = int(os.environ.get('SALES_DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+DEFAULT_VERSION_CHECK_INTERVAL = float(os.environ.get('SALES_DB_VERSION_CHECK_INTERVAL', '1.0'))
+
+# Read size used when pulling the database file into the OS page cache
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+
+# Most bytes of the database file pulled into the page cache by `prefetch`; 0 disables it
+DEFAULT_PREFETCH_MAX_BYTES = int(os.environ.get('SALES_DB_PREFETCH_MAX_BYTES', str(DEFAULT_MMAP_SIZE)))
+
+# Run on every connection checked out of the pool; left out of the statement timings
+HEALTH_CHECK_SQL = 'SELECT 1'
+
+# (inode, mtime in ns, size, header file change counter, PRAGMA data_version)
+Version = Tuple[int, int, int, int, int]
+
+# Called with each executed statement and its duration in seconds
+QueryObserver = Callable[[str, float], None]
+
+T = TypeVar('T')
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """
+    Raised when no connection becomes available within the pool timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of read-only SQLite connections.
+
+    Connections are opened lazily, at most `size` of them, and are reused across
+    requests instead of being opened and closed per query. Each connection keeps
+    its own compiled statement cache, so repeated queries skip the SQL compile step.
+    A connection is health-checked when it is checked out and transparently
+    replaced if it has gone bad. `versions` tracks the version of the file, and
+    `per_version` keeps facts about it, such as which tables exist, until it changes.
+    """
+
+    def __init__(self, database_path: str, size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_POOL_TIMEOUT,
+                 cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+                 immutable: bool = False, mmap_size: int = DEFAULT_MMAP_SIZE,
+                 observer: Optional[QueryObserver] = None) -> None:
+        """
+        Args:
+            database_path (str): Path to the SQLite database file.
+            size (int): Maximum number of open connections.
+            timeout (float): Seconds to wait for a free connection before giving up.
+            cached_statements (int): Size of each connection's prepared statement cache.
+            immutable (bool): Open the file with `immutable=1`, skipping all locking and change
+                detection. Only safe when nothing can modify the file, e.g. a deployed artifact.
+            mmap_size (int): Bytes of the file SQLite may memory-map instead of copying pages in.
+            observer (Optional[QueryObserver]): Receives every statement run on a pooled connection
+                and how long it took, timed with SQLite's trace hook.
+        """
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.database_path = database_path
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.immutable = immutable
+        self.mmap_size = mmap_size
+        self.observer = observer
+        self._statement = threading.local()
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+        self.versions = DatabaseVersion(database_path)
+        # key -> (version token the value was computed at, value)
+        self._per_version: Dict[str, Tuple[str, Any]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a new read-only connection to the database.
+
+        Returns:
+            sqlite3.Connection: A connection with `sqlite3.Row` as its row factory.
+        """
+        uri = f'file:{os.path.abspath(self.database_path)}?mode=ro'
+        if self.immutable:
+            uri += '&immutable=1'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        if self.mmap_size:
+            conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        if self.observer is not None:
+            conn.set_trace_callback(self._trace)
+        return conn
+
+    def _trace(self, sql: str) -> None:
+        """
+        SQLite trace hook: a statement is starting on this thread, so the previous one has finished.
+
+        Statements SQLite runs internally on behalf of another (e.g. FTS5 index lookups)
+        are reported with a leading '--' and count towards the outer statement. The pool's
+        own health check is not reported.
+        """
+        if sql.startswith('--') or sql == HEALTH_CHECK_SQL:
+            return
+        now = time.perf_counter()
+        self._finish_statement(now)
+        self._statement.current = (sql, now)
+
+    def _finish_statement(self, now: float) -> None:
+        """
+        Reports the statement this thread last started, if any.
+
+        SQLite has no hook for a statement finishing, and rows are stepped lazily as
+        they are fetched, so a statement is timed until the next one starts on the same
+        thread or its connection goes back to the pool.
+        """
+        current = getattr(self._statement, 'current', None)
+        if current is not None:
+            self._statement.current = None
+            try:
+                self.observer(current[0], now - current[1])
+            except Exception as e:
+                logger.error(f'Error recording SQL timing: {e}')
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        """
+        Checks that a pooled connection can still run a trivial query.
+        """
+        try:
+            conn.execute(HEALTH_CHECK_SQL).fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        """
+        Closes a connection and frees its slot in the pool.
+        """
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Checks out a healthy connection, opening one if the pool is not yet full.
+
+        Returns:
+            sqlite3.Connection: A connection that must be handed back with `release`.
+
+        Raises:
+            PoolTimeout: If no connection is free within the pool timeout.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._opened < self.size
+                    if can_open:
+                        self._opened += 1
+                if can_open:
+                    try:
+                        return self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._opened -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f'No database connection available after {self.timeout}s')
+            if self._is_healthy(conn):
+                return conn
+            logger.warning('Discarding unhealthy database connection')
+            self._discard(conn)
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False) -> None:
+        """
+        Returns a connection to the pool, or closes it if it is broken.
+
+        Args:
+            conn (sqlite3.Connection): The connection obtained from `acquire`.
+            broken (bool): Whether the connection failed while in use.
+        """
+        if self.observer is not None:
+            self._finish_statement(time.perf_counter())
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Context manager that checks out a connection and always returns it.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            self.release(conn, broken=not self._is_healthy(conn))
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def fetch_all(self, sql: str, params: Tuple[Any, ...] = ()) -> List[sqlite3.Row]:
+        """
+        Runs a query on a pooled connection and returns all rows.
+        """
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def fetch_one(self, sql: str, params: Tuple[Any, ...] = ()) -> Optional[sqlite3.Row]:
+        """
+        Runs a query on a pooled connection and returns the first row, if any.
+        """
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def per_version(self, key: str, compute: Callable[[], T]) -> T:
+        """
+        Returns `compute()`, computed once per version of the database file and cached under `key`.
+
+        Meant for checks that only change with the file, such as whether a table exists, so
+        they do not cost a query on every request. Nothing is cached while the version is unknown.
+        """
+        token = self.versions.token()
+        cached = self._per_version.get(key)
+        if cached is not None and token is not None and cached[0] == token:
+            return cached[1]
+        value = compute()
+        if token is not None:
+            self._per_version[key] = (token, value)
+        return value
+
+    def prefetch(self, max_bytes: int = DEFAULT_PREFETCH_MAX_BYTES) -> int:
+        """
+        Reads the start of the database file so its pages are in the OS page cache before the first query.
+
+        Args:
+            max_bytes (int): Most bytes to read, at most `mmap_size` when memory-mapping (the
+                pages SQLite maps); a large database is otherwise only partly cached.
+
+        Returns:
+            int: Number of bytes read.
+        """
+        if self.mmap_size:
+            max_bytes = min(max_bytes, self.mmap_size)
+        read = 0
+        with open(self.database_path, 'rb', buffering=0) as f:
+            while read < max_bytes:
+                chunk = f.read(min(PREFETCH_CHUNK_SIZE, max_bytes - read))
+                if not chunk:
+                    break
+                read += len(chunk)
+        return read
+
+    def warm(self, statements: Iterable[Tuple[str, Tuple[Any, ...]]] = ()) -> None:
+        """
+        Opens every connection in the pool up front and compiles the given statements on each,
+        so the first requests find pages cached and statements prepared.
+
+        Args:
+            statements (Iterable[Tuple[str, Tuple[Any, ...]]]): SQL and sample parameters to prepare.
+        """
+        self.prefetch()
+        statements = list(statements)
+        conns = [self.acquire() for _ in range(self.size)]
+        try:
+            for conn in conns:
+                for sql, params in statements:
+                    conn.execute(sql, params).fetchone()
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    def close(self) -> None:
+        """
+        Closes every idle connection held by the pool, and the one reading its version.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        self.versions.close()
+
+
+class DatabaseVersion:
+    """
+    Tracks a cheap version of the database file that changes whenever its content does.
+
+    The version combines the file's inode, mtime and size, the file change counter
+    SQLite keeps in the database header, and `PRAGMA data_version`. It is re-read at
+    most once per `check_interval` seconds, so callers can consult it on every request.
+    """
+
+    def __init__(self, database_path: str, check_interval: float = DEFAULT_VERSION_CHECK_INTERVAL) -> None:
+        """
+        Args:
+            database_path (str): Path to the SQLite database file.
+            check_interval (float): Minimum seconds between reads of the file's version.
+        """
+        self.database_path = database_path
+        self.check_interval = check_interval
+        self._version: Optional[Version] = None
+        self._token: Optional[str] = None
+        self._last_check = float('-inf')
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_key: Optional[Tuple[int, int]] = None
+        self._data_version = 0
+        self._data_version_offset = 0
+        self._lock = threading.Lock()
+
+    def _read(self) -> Version:
+        """
+        Reads the version from the file system, the database header and SQLite.
+
+        `PRAGMA data_version` only changes when *another* connection commits, so a
+        dedicated connection is kept for it; it is reopened whenever the file's inode
+        or mtime moves, which also covers the file being replaced on deploy. A new
+        connection's counter starts over, so it is offset to carry on from the last value.
+        """
+        stat = os.stat(self.database_path)
+        with open(self.database_path, 'rb') as f:
+            header = f.read(100)
+        change_counter = int.from_bytes(header[24:28], 'big') if len(header) >= 28 else 0
+        key = (stat.st_ino, stat.st_mtime_ns)
+        if self._conn is None or self._conn_key != key:
+            if self._conn is not None:
+                self._conn.close()
+            uri = f'file:{os.path.abspath(self.database_path)}?mode=ro'
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._conn_key = key
+            self._data_version_offset = self._data_version - self._conn.execute('PRAGMA data_version').fetchone()[0]
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0] + self._data_version_offset
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size, change_counter, self._data_version
+
+    def current(self) -> Optional[Version]:
+        """
+        Returns the database version, re-reading it if the check interval has passed.
+
+        Returns:
+            Optional[Version]: The version, or None if the database cannot be read.
+        """
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval and self._lock.acquire(blocking=False):
+            try:
+                self._last_check = now
+                try:
+                    version = self._read()
+                except (sqlite3.Error, OSError) as e:
+                    logger.error(f'Error reading the database version: {e}')
+                    version = None
+                if version != self._version:
+                    self._token = None if version is None else hashlib.blake2b(
+                        repr(version).encode(), digest_size=8).hexdigest()
+                    self._version = version
+            finally:
+                self._lock.release()
+        return self._version
+
+    def token(self) -> Optional[str]:
+        """
+        Returns the current version as a short opaque string, e.g. for ETags and cache keys.
+        """
+        self.current()
+        return self._token
+
+    def close(self) -> None:
+        """
+        Closes the connection used to read the version; the next read opens a new one.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._conn_key = None
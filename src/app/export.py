@@ -0,0 +1,223 @@
+from typing import Iterator
+from typing import Optional
+from typing import Mapping
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from snapshot import AccountSnapshot
+from snapshot import ACCOUNT_COLUMNS
+from filters import FILTER_COLUMNS
+from filters import BitmapIndex
+from serialize import dumps
+from db import ConnectionPool
+import io
+import os
+
+# Optional Arrow IPC output; column-oriented JSON is used when pyarrow is not installed
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+
+# Rows per exported batch, overridable through the environment
+EXPORT_BATCH_SIZE = int(os.environ.get('SALES_EXPORT_BATCH_SIZE', '10000'))
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+COLUMNAR_JSON_MIMETYPE = 'application/json'
+
+# Low-cardinality columns sent as integer codes into a per-column dictionary of values
+DICTIONARY_COLUMNS = FILTER_COLUMNS
+
+# Exported formats, most preferred first
+FORMATS = ('arrow', 'json') if pyarrow is not None else ('json',)
+
+
+def parse_columns(args: Mapping[str, str]) -> List[str]:
+    """
+    Reads the comma-separated `columns` query parameter; all account columns when absent.
+
+    Raises:
+        ValueError: If a column is unknown.
+    """
+    text = args.get('columns')
+    if not text:
+        return list(ACCOUNT_COLUMNS)
+    columns = list(dict.fromkeys(column.strip() for column in text.split(',') if column.strip()))
+    unknown = [column for column in columns if column not in ACCOUNT_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"columns must be a comma-separated subset of {', '.join(ACCOUNT_COLUMNS)}")
+    return columns
+
+
+def negotiate_format(args: Mapping[str, str], accept_mimetypes: Any) -> str:
+    """
+    Picks 'arrow' or 'json' from the `format` parameter, else from the `Accept` header.
+
+    Raises:
+        LookupError: If the requested format is not available on this server.
+    """
+    requested = args.get('format')
+    if requested:
+        if requested not in FORMATS:
+            raise LookupError(f"format must be one of {', '.join(FORMATS)}")
+        return requested
+    if pyarrow is not None and accept_mimetypes.best_match([COLUMNAR_JSON_MIMETYPE, ARROW_MIMETYPE]) == ARROW_MIMETYPE:
+        return 'arrow'
+    return 'json'
+
+
+def iter_batches(snapshot: AccountSnapshot, pools: List[ConnectionPool], columns: List[str],
+                 filters: Mapping[str, str], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Yields the matching accounts as lists of row tuples holding only `columns`, in storage order.
+
+    Rows come from the snapshot's bitmap index when it is loaded. Otherwise each pool
+    (one per shard, or just the main pool) is read in keyset pages on `rowid`, so no
+    connection is held between batches and memory stays bounded by `batch_size`.
+    """
+    index = snapshot.derived('bitmaps', BitmapIndex.from_snapshot)
+    if index is not None:
+        batch: List[Tuple[Any, ...]] = []
+        for account in index.iter_rows(index.match(filters)):
+            batch.append(tuple(account[column] for column in columns))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+    where = ''.join(f' AND {column} = ? COLLATE NOCASE' for column in filters)
+    sql = f'SELECT rowid, {", ".join(columns)} FROM accounts WHERE rowid > ?{where} ORDER BY rowid LIMIT ?'
+    for pool in pools:
+        after = 0
+        while True:
+            rows = pool.fetch_all(sql, (after, *filters.values(), batch_size))
+            if not rows:
+                break
+            yield [tuple(row)[1:] for row in rows]
+            if len(rows) < batch_size:
+                break
+            after = rows[-1][0]
+
+
+class DictionaryEncoder:
+    """
+    Replaces the values of the dictionary columns with integer codes, growing each dictionary as new values appear.
+    """
+
+    def __init__(self, columns: List[str]) -> None:
+        self.columns = columns
+        self.positions = [i for i, column in enumerate(columns) if column in DICTIONARY_COLUMNS]
+        self.codes: Dict[str, Dict[Any, int]] = {columns[i]: {} for i in self.positions}
+        self.values: Dict[str, List[Any]] = {columns[i]: [] for i in self.positions}
+
+    def encode(self, batch: List[Tuple[Any, ...]]) -> Tuple[Dict[str, List[Any]], Dict[str, List[Any]]]:
+        """
+        Turns a batch of rows into columns.
+
+        Returns:
+            Tuple[Dict[str, List[Any]], Dict[str, List[Any]]]: The column values (codes for the
+                dictionary columns), and the values each dictionary gained with this batch.
+        """
+        data = {column: list(values) for column, values in zip(self.columns, zip(*batch))}
+        deltas: Dict[str, List[Any]] = {}
+        for i in self.positions:
+            column = self.columns[i]
+            codes = self.codes[column]
+            values = self.values[column]
+            start = len(values)
+            encoded = []
+            for value in data[column]:
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(values)
+                    values.append(value)
+                encoded.append(code)
+            data[column] = encoded
+            if len(values) > start:
+                deltas[column] = values[start:]
+        return data, deltas
+
+
+def export_json(batches: Iterator[List[Tuple[Any, ...]]], columns: List[str]) -> Iterator[bytes]:
+    """
+    Streams batches as one column-oriented JSON document.
+
+    The document is {"columns": [...], "dictionary_columns": [...], "batches": [...]}. Each
+    batch holds its `length` and one array per column. Dictionary columns hold integer
+    codes, and a batch's `dictionaries` lists the values added to each dictionary by that
+    batch. A column's dictionary is the concatenation of its additions so far, so code `i`
+    is the `i`-th value ever added, as with Arrow delta dictionaries.
+    """
+    encoder = DictionaryEncoder(columns)
+    header = {'columns': columns, 'dictionary_columns': [columns[i] for i in encoder.positions]}
+    yield dumps(header)[:-1] + b',"batches":['
+    separator = b''
+    for batch in batches:
+        data, deltas = encoder.encode(batch)
+        yield separator + dumps({'length': len(batch), 'dictionaries': deltas, **data})
+        separator = b','
+    yield b']}'
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def export_arrow(batches: Iterator[List[Tuple[Any, ...]]], columns: List[str]) -> Iterator[bytes]:
+    """
+    Streams batches in the Arrow IPC stream format, with dictionary-encoded low-cardinality columns.
+
+    Dictionaries only grow, so later batches carry delta dictionaries instead of repeating them.
+    """
+    encoder = DictionaryEncoder(columns)
+    dictionary_columns = {columns[i] for i in encoder.positions}
+    schema = pyarrow.schema([
+        pyarrow.field(column, pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+                      if column in dictionary_columns else pyarrow.string())
+        for column in columns])
+    sink = io.BytesIO()
+    options = pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    writer = pyarrow.ipc.new_stream(sink, schema, options=options)
+    try:
+        for batch in batches:
+            data, _ = encoder.encode(batch)
+            arrays = [
+                pyarrow.DictionaryArray.from_arrays(pyarrow.array(data[column], pyarrow.int32()),
+                                                    pyarrow.array(encoder.values[column], pyarrow.string()))
+                if column in dictionary_columns else pyarrow.array(data[column], pyarrow.string())
+                for column in columns]
+            writer.write_batch(pyarrow.record_batch(arrays, schema=schema))
+            yield _drain(sink)
+    finally:
+        writer.close()
+    yield _drain(sink)
+
+
+def export_accounts(snapshot: AccountSnapshot, pools: List[ConnectionPool], columns: List[str],
+                    filters: Mapping[str, str], fmt: str = 'json',
+                    batch_size: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Streams the accounts matching `filters`, projected to `columns`, in a columnar format.
+
+    Args:
+        snapshot (AccountSnapshot): In-memory accounts, if available.
+        pools (List[ConnectionPool]): Pools read in order when there is no snapshot.
+        columns (List[str]): Account columns to include, in order.
+        filters (Mapping[str, str]): Column to value, for columns in FILTER_COLUMNS.
+        fmt (str): 'arrow' (Arrow IPC stream) or 'json' (column-oriented JSON).
+        batch_size (Optional[int]): Rows per batch; defaults to SALES_EXPORT_BATCH_SIZE.
+
+    Returns:
+        Iterator[bytes]: The body, in chunks of about one batch.
+    """
+    batches = iter_batches(snapshot, pools, columns, filters, batch_size or EXPORT_BATCH_SIZE)
+    if fmt == 'arrow':
+        return export_arrow(batches, columns)
+    return export_json(batches, columns)
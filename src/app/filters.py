@@ -0,0 +1,202 @@
+from typing import Optional
+from typing import Iterator
+from typing import Mapping
+from typing import Dict
+from typing import List
+from typing import Any
+from snapshot import AccountSnapshot
+from snapshot import ACCOUNT_COLUMNS
+from snapshot import AccountData
+from db import ConnectionPool
+from array import array
+import logging
+import string
+import re
+import os
+
+
+logger = logging.getLogger(__name__)
+
+
+# Low-cardinality columns that can be filtered on
+FILTER_COLUMNS = ('industry', 'region', 'status')
+
+# Distinct values a column may have for the bitmap index to be built; each one costs a bitmap of
+# one bit per account, so beyond this the filters run in SQL
+MAX_BITMAP_VALUES = int(os.environ.get('SALES_BITMAP_MAX_VALUES', '1024'))
+
+# Per-row code arrays, narrowest first, with the number of codes each can hold
+CODE_TYPECODES = (('B', 1 << 8), ('H', 1 << 16), ('I', 1 << 32))
+
+# SQLite's NOCASE folds ASCII letters only, so the bitmap lookups do the same
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Finds the non-zero bytes of a bitmap without a Python-level loop over the zero ones
+NONZERO_BYTE = re.compile(rb'[^\x00]')
+
+# Bit positions set in each possible byte value
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+def nocase(value: str) -> str:
+    """
+    Folds a value the way `COLLATE NOCASE` compares it: ASCII letters lowercased, everything else as is.
+    """
+    return value.translate(ASCII_LOWER)
+
+
+def parse_filters(args: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Picks the filter columns out of the query parameters.
+    """
+    return {column: args[column] for column in FILTER_COLUMNS if args.get(column)}
+
+
+class BitmapIndex:
+    """
+    Dictionary-encoded, bitmap-indexed copy of the low-cardinality account columns.
+
+    Each filter column is stored as one small integer code per row, plus one bitmap per
+    distinct value with bit `i` set when row `i` has that value. Bitmaps are Python ints,
+    so a combined filter is a handful of C-level bitwise ANDs over `n / 8` bytes rather
+    than a scan of the rows. Values are matched ignoring ASCII case, as the SQL fallback's
+    `COLLATE NOCASE` does, and the codes use the narrowest array type that holds them.
+    """
+
+    def __init__(self, accounts: List[Dict[str, Any]]) -> None:
+        """
+        Args:
+            accounts (List[Dict[str, Any]]): Account records, in the order results should be returned.
+        """
+        self.accounts = accounts
+        self.size = len(accounts)
+        self.all = (1 << self.size) - 1
+        # column -> code -> value as stored
+        self.values: Dict[str, List[str]] = {}
+        # column -> NOCASE-folded value -> code
+        self.codes: Dict[str, Dict[str, int]] = {}
+        # column -> per-row codes
+        self.columns: Dict[str, array] = {}
+        # column -> code -> bitmap
+        self.bitmaps: Dict[str, List[int]] = {}
+        nbytes = (self.size + 7) // 8
+        for column in FILTER_COLUMNS:
+            values: List[str] = []
+            codes: Dict[str, int] = {}
+            # Codes of values as stored, so each distinct spelling is folded once
+            seen: Dict[str, int] = {}
+            typecodes = iter(CODE_TYPECODES)
+            typecode, capacity = next(typecodes)
+            encoded = array(typecode)
+            buffers: List[bytearray] = []
+            for i, account in enumerate(accounts):
+                value = account[column]
+                code = seen.get(value)
+                if code is None:
+                    key = nocase(value)
+                    code = codes.get(key)
+                    if code is None:
+                        if len(values) == MAX_BITMAP_VALUES:
+                            raise OverflowError(f"'{column}' has more than {MAX_BITMAP_VALUES} distinct values")
+                        code = codes[key] = len(values)
+                        values.append(value)
+                        buffers.append(bytearray(nbytes))
+                        if code == capacity:
+                            typecode, capacity = next(typecodes)
+                            encoded = array(typecode, encoded)
+                    seen[value] = code
+                encoded.append(code)
+                buffers[code][i >> 3] |= 1 << (i & 7)
+            self.values[column] = values
+            self.codes[column] = codes
+            self.columns[column] = encoded
+            self.bitmaps[column] = [int.from_bytes(buffer, 'little') for buffer in buffers]
+
+    @classmethod
+    def from_snapshot(cls, data: AccountData) -> Optional['BitmapIndex']:
+        """
+        Builds the index over a loaded snapshot, or returns None (filter in SQL) if a column has too many values.
+        """
+        try:
+            return cls(data.accounts)
+        except OverflowError as e:
+            logger.warning(f'Not building the bitmap index, filters will use SQL: {e}')
+            return None
+
+    def bitmap(self, column: str, value: str) -> int:
+        """
+        Returns the bitmap of rows where `column` equals `value` (empty if the value is unknown).
+        """
+        code = self.codes[column].get(nocase(value))
+        return 0 if code is None else self.bitmaps[column][code]
+
+    def match(self, filters: Mapping[str, str]) -> int:
+        """
+        ANDs together the bitmaps for every filter; no filters matches every row.
+        """
+        result = self.all
+        for column, value in filters.items():
+            result &= self.bitmap(column, value)
+            if not result:
+                break
+        return result
+
+    def iter_rows(self, bitmap: int) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every account whose bit is set, in row order.
+        """
+        data = bitmap.to_bytes((self.size + 7) // 8, 'little')
+        for match in NONZERO_BYTE.finditer(data):
+            start = match.start()
+            base = start * 8
+            for bit in BYTE_BITS[data[start]]:
+                yield self.accounts[base + bit]
+
+    def rows(self, bitmap: int, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Returns the accounts whose bits are set, in row order, skipping `offset` and stopping at `limit`.
+        """
+        found: List[Dict[str, Any]] = []
+        if limit <= 0 or not bitmap:
+            return found
+        data = bitmap.to_bytes((self.size + 7) // 8, 'little')
+        skip = offset
+        for match in NONZERO_BYTE.finditer(data):
+            start = match.start()
+            bits = BYTE_BITS[data[start]]
+            if skip >= len(bits):
+                skip -= len(bits)
+                continue
+            base = start * 8
+            for bit in bits[skip:]:
+                found.append(self.accounts[base + bit])
+                if len(found) == limit:
+                    return found
+            skip = 0
+        return found
+
+
+def filter_accounts(snapshot: AccountSnapshot, pool: ConnectionPool, filters: Mapping[str, str],
+                    limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Returns the accounts matching every filter, in table order.
+
+    Served from the bitmap index when the snapshot is loaded and by an equivalent
+    SQL query otherwise.
+
+    Args:
+        snapshot (AccountSnapshot): Snapshot the bitmap index is built from.
+        pool (ConnectionPool): Pool used when there is no snapshot.
+        filters (Mapping[str, str]): Column to value, for columns in FILTER_COLUMNS.
+        limit (int): Maximum number of accounts to return.
+        offset (int): Number of matching accounts to skip.
+
+    Returns:
+        List[Dict[str, Any]]: The matching accounts.
+    """
+    index = snapshot.derived('bitmaps', BitmapIndex.from_snapshot)
+    if index is not None:
+        return index.rows(index.match(filters), limit, offset)
+    where = ' AND '.join(f'{column} = ? COLLATE NOCASE' for column in filters) or '1'
+    sql = f'SELECT {", ".join(ACCOUNT_COLUMNS)} FROM accounts WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?'
+    return [dict(row) for row in pool.fetch_all(sql, (*filters.values(), limit, offset))]
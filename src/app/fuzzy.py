@@ -0,0 +1,312 @@
+from collections import defaultdict
+from collections import Counter
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from snapshot import AccountSnapshot
+from db import ConnectionPool
+from array import array
+from bisect import bisect_left
+import heapq
+import os
+
+
+# Fuzzy search settings, overridable through the environment
+DEFAULT_FUZZY_LIMIT = int(os.environ.get('SALES_FUZZY_DEFAULT_LIMIT', '10'))
+MAX_FUZZY_LIMIT = int(os.environ.get('SALES_FUZZY_MAX_LIMIT', '100'))
+DEFAULT_MIN_SCORE = float(os.environ.get('SALES_FUZZY_MIN_SCORE', '0.5'))
+
+# Number of candidates re-ranked by edit distance per requested result
+RERANK_FACTOR = 4
+MIN_RERANK = 32
+
+# Most posting entries counted per length window; bounds the work per query whatever the index size
+MAX_SCANNED_POSTINGS = int(os.environ.get('SALES_FUZZY_MAX_POSTINGS', '8000'))
+
+# Widths of the name length windows searched in turn (most characters a name's length may differ
+# from the query's); a last window reaches as far as `min_score` allows
+LENGTH_WINDOWS = (2, 6)
+
+# FTS5 candidate query used when no in-memory index is available
+FTS_CANDIDATES_SQL = '''
+    SELECT a.id, a.name, a.industry, a.region, a.status
+    FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid
+    WHERE accounts_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+'''
+
+
+def normalize(name: str) -> str:
+    """
+    Lowercases a name and collapses runs of whitespace.
+    """
+    return ' '.join(name.lower().split())
+
+
+def trigrams(text: str) -> List[str]:
+    """
+    Returns the distinct padded trigrams of a normalized string.
+    """
+    padded = f'  {text} '
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+def pattern_masks(text: str) -> Dict[str, int]:
+    """
+    Returns, per character of `text`, the bitmask of the positions where it occurs; see `bit_distance`.
+    """
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(text):
+        masks[char] = masks.get(char, 0) | 1 << i
+    return masks
+
+
+def bit_distance(masks: Dict[str, int], length: int, text: str) -> int:
+    """
+    Computes the Levenshtein distance from a pattern to `text` with Myers' bit-parallel algorithm.
+
+    Each column of the edit distance matrix is held as two bitmasks of vertical +1 / -1
+    steps, so a step through `text` is a handful of integer operations instead of a
+    Python loop over the pattern.
+
+    Args:
+        masks (Dict[str, int]): `pattern_masks` of the pattern.
+        length (int): Length of the pattern.
+        text (str): String to compare the pattern with.
+
+    Returns:
+        int: The number of single-character edits turning the pattern into `text`.
+    """
+    if length == 0:
+        return len(text)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    plus, minus, distance = full, 0, length
+    for char in text:
+        eq = masks.get(char, 0)
+        vertical = eq | minus
+        horizontal = (((eq & plus) + plus) ^ plus) | eq
+        h_plus = minus | ~(horizontal | plus)
+        h_minus = plus & horizontal
+        if h_plus & last:
+            distance += 1
+        elif h_minus & last:
+            distance -= 1
+        h_plus = (h_plus << 1) | 1
+        h_minus <<= 1
+        plus = (h_minus | ~(vertical | h_plus)) & full
+        minus = h_plus & vertical
+    return distance
+
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    Computes the Levenshtein distance between two strings.
+
+    Args:
+        a (str): First string.
+        b (str): Second string.
+        max_distance (Optional[int]): Return max_distance + 1 for anything farther apart.
+
+    Returns:
+        int: The number of single-character edits turning `a` into `b`.
+    """
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    distance = bit_distance(pattern_masks(a), len(a), b)
+    return distance if max_distance is None else min(distance, max_distance + 1)
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Scores two normalized strings between 0 (nothing in common) and 1 (identical).
+    """
+    longest = max(len(a), len(b))
+    if longest == 0:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / longest
+
+
+def rank(query: str, candidates: Iterable[Tuple[str, List[Dict[str, Any]]]], limit: int,
+         min_score: float) -> List[Dict[str, Any]]:
+    """
+    Re-ranks candidate names by edit distance to the query.
+
+    Args:
+        query (str): Normalized query.
+        candidates (Iterable[Tuple[str, List[Dict[str, Any]]]]): Normalized names and the accounts that carry them.
+        limit (int): Maximum number of accounts to return.
+        min_score (float): Minimum similarity for a match.
+
+    Returns:
+        List[Dict[str, Any]]: Accounts with a `score` field, best first.
+    """
+    masks = pattern_masks(query)
+    scored = []
+    for name, accounts in candidates:
+        longest = max(len(query), len(name))
+        if abs(len(query) - len(name)) > longest * (1.0 - min_score):
+            continue
+        score = 1.0 - bit_distance(masks, len(query), name) / longest if longest else 1.0
+        if score >= min_score:
+            scored.extend((score, account) for account in accounts)
+    best = heapq.nlargest(limit, scored, key=lambda pair: pair[0])
+    return [{**account, 'score': round(score, 3)} for score, account in best]
+
+
+class FuzzyNameIndex:
+    """
+    A typo-tolerant, in-memory index over account names.
+
+    Each distinct normalized name is broken into padded trigrams with a posting list per
+    trigram. Names are numbered shortest first, so every posting list is also ordered by
+    name length and the names of a given length range are one slice of it, found by
+    bisection. A query looks at names of about its own length first: within the window it
+    counts the trigrams each name shares with the query, rarest trigrams first and at
+    most MAX_SCANNED_POSTINGS posting entries, then re-ranks the names sharing the most by
+    Levenshtein similarity. A name whose length differs by `d` is at least `d` edits away,
+    so wider windows (LENGTH_WINDOWS) are only searched while a name there could still
+    beat the best match found.
+    """
+
+    def __init__(self, accounts: Iterable[Dict[str, Any]]) -> None:
+        """
+        Args:
+            accounts (Iterable[Dict[str, Any]]): Account records with at least `name`.
+        """
+        by_name: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for account in accounts:
+            by_name[normalize(account['name'])].append(account)
+        self.names: List[str] = sorted(by_name, key=lambda name: (len(name), name))
+        self.accounts: List[List[Dict[str, Any]]] = [by_name[name] for name in self.names]
+        # starts[n]: number of names shorter than n characters, i.e. the first name ID of length >= n
+        longest = len(self.names[-1]) if self.names else 0
+        self.starts = array('I', [0] * (longest + 2))
+        for name in self.names:
+            self.starts[len(name) + 1] += 1
+        for length in range(1, longest + 2):
+            self.starts[length] += self.starts[length - 1]
+        postings = defaultdict(lambda: array('I'))
+        for name_id, name in enumerate(self.names):
+            for gram in trigrams(name):
+                postings[gram].append(name_id)
+        self.postings: Dict[str, array] = dict(postings)
+
+    def _id_range(self, shortest: int, longest: int) -> Tuple[int, int]:
+        """
+        Returns the IDs [start, stop) of the names from `shortest` to `longest` characters long.
+        """
+        top = len(self.starts) - 1
+        return self.starts[min(max(shortest, 0), top)], self.starts[min(max(longest + 1, 0), top)]
+
+    def _candidates(self, grams: List[str], ranges: List[Tuple[int, int]],
+                    rerank: int) -> Iterable[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Returns the `rerank` names within `ranges` sharing the most of `grams`, rarest trigrams counted first.
+        """
+        slices = []
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                continue
+            for start, stop in ranges:
+                lo = bisect_left(posting, start)
+                hi = bisect_left(posting, stop, lo)
+                if hi > lo:
+                    slices.append((hi - lo, lo, hi, posting))
+        slices.sort(key=lambda piece: piece[0])
+        overlap = Counter()
+        scanned = 0
+        for size, lo, hi, posting in slices:
+            if scanned and scanned + size > MAX_SCANNED_POSTINGS:
+                break
+            overlap.update(posting[lo:hi])
+            scanned += size
+        return [(self.names[name_id], self.accounts[name_id]) for name_id, _ in overlap.most_common(rerank)]
+
+    def search(self, query: str, limit: int = DEFAULT_FUZZY_LIMIT,
+               min_score: float = DEFAULT_MIN_SCORE) -> List[Dict[str, Any]]:
+        """
+        Finds the accounts whose names are closest to `query`.
+
+        Args:
+            query (str): Name to look up, possibly misspelled.
+            limit (int): Maximum number of accounts to return.
+            min_score (float): Minimum similarity for a match.
+
+        Returns:
+            List[Dict[str, Any]]: Accounts with a `score` field, best first.
+        """
+        query = normalize(query)
+        if not query or limit <= 0 or min_score <= 0:
+            return []
+        grams = trigrams(query)
+        size = len(query)
+        rerank = max(limit * RERANK_FACTOR, MIN_RERANK)
+        # Longer names than this are too many edits away to reach min_score
+        widest = int(size * (1.0 - min_score) / min_score)
+        results: List[Dict[str, Any]] = []
+        searched = -1
+        for width in (*LENGTH_WINDOWS, widest):
+            width = min(width, widest)
+            if width <= searched:
+                break
+            # The best possible score of a name outside the lengths searched so far
+            if searched >= 0 and results and results[0]['score'] >= 1.0 - (searched + 1) / (size + searched + 1):
+                break
+            if searched < 0:
+                ranges = [self._id_range(size - width, size + width)]
+            else:
+                ranges = [self._id_range(size - width, size - searched - 1),
+                          self._id_range(size + searched + 1, size + width)]
+            searched = width
+            found = rank(query, self._candidates(grams, ranges, rerank), limit, min_score)
+            results = heapq.nlargest(limit, results + found, key=lambda account: account['score'])
+        return results
+
+
+def fts_search(pool: ConnectionPool, query: str, limit: int = DEFAULT_FUZZY_LIMIT,
+               min_score: float = DEFAULT_MIN_SCORE) -> List[Dict[str, Any]]:
+    """
+    Fuzzy search through the FTS5 trigram index, for when no in-memory index is loaded.
+
+    Candidates are the best BM25 matches for any of the query's trigrams, re-ranked
+    the same way as `FuzzyNameIndex.search`.
+    """
+    query = normalize(query)
+    # The FTS tokenizer does not pad names, so only probe trigrams from inside the query
+    grams = list(dict.fromkeys(query[i:i + 3] for i in range(len(query) - 2)))
+    grams = [gram for gram in grams if '"' not in gram]
+    if not grams or limit <= 0:
+        return []
+    match = ' OR '.join(f'"{gram}"' for gram in grams)
+    rows = pool.fetch_all(FTS_CANDIDATES_SQL, (match, max(limit * RERANK_FACTOR, MIN_RERANK)))
+    by_name: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        by_name[normalize(row['name'])].append(dict(row))
+    return rank(query, by_name.items(), limit, min_score)
+
+
+def search_accounts_fuzzy(snapshot: AccountSnapshot, pool: ConnectionPool, query: str,
+                          limit: int = DEFAULT_FUZZY_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Ranked fuzzy name search, from the in-memory index when the snapshot is loaded and
+    through the FTS5 trigram index otherwise.
+
+    Args:
+        snapshot (AccountSnapshot): Snapshot the in-memory index is built from.
+        pool (ConnectionPool): Pool used for the FTS5 fallback.
+        query (str): Name to look up, possibly misspelled.
+        limit (int): Maximum number of accounts to return.
+
+    Returns:
+        List[Dict[str, Any]]: Accounts with a `score` field, best first.
+    """
+    index = snapshot.derived('fuzzy', lambda data: FuzzyNameIndex(data.accounts))
+    if index is not None:
+        return index.search(query, limit)
+    return fts_search(pool, query, limit)
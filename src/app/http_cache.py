@@ -0,0 +1,85 @@
+from typing import Iterable
+from typing import Optional
+from flask import Response
+from flask import request
+from flask import Flask
+from flask import g
+from db import DatabaseVersion
+import hashlib
+import os
+
+
+# Seconds clients and shared caches may reuse a response before revalidating it
+DEFAULT_MAX_AGE = int(os.environ.get('SALES_CACHE_MAX_AGE', '30'))
+
+# Request headers that select a different representation of the same URL
+VARY_HEADERS = ('Accept', 'Accept-Encoding')
+
+
+class ConditionalCache:
+    """
+    Strong ETags and `304 Not Modified` for read-only routes, keyed on the database version.
+
+    A response is fully determined by the database content, the URL and the headers
+    in VARY_HEADERS, so its ETag is a hash of exactly those and can be computed before
+    the route runs. A matching `If-None-Match` is therefore answered with a 304 without
+    touching the data, and 200 responses carry the ETag plus `Cache-Control` so the
+    agent runtime and intermediate caches can reuse them.
+    """
+
+    def __init__(self, versions: DatabaseVersion, endpoints: Iterable[str],
+                 max_age: int = DEFAULT_MAX_AGE) -> None:
+        """
+        Args:
+            versions (DatabaseVersion): Version tracker for the database behind the routes.
+            endpoints (Iterable[str]): Flask endpoint names of the cacheable GET routes.
+            max_age (int): Seconds a response may be reused before it must be revalidated.
+        """
+        self.versions = versions
+        self.endpoints = frozenset(endpoints)
+        self.max_age = max_age
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Registers the request hooks on a Flask app.
+        """
+        app.before_request(self.check_not_modified)
+        app.after_request(self.add_cache_headers)
+
+    def etag(self) -> Optional[str]:
+        """
+        Computes the ETag of the current request's response, or None if it is not cacheable.
+        """
+        if request.method not in ('GET', 'HEAD') or request.endpoint not in self.endpoints:
+            return None
+        token = self.versions.token()
+        if token is None:
+            return None
+        key = '\n'.join([token, request.full_path, *(request.headers.get(name, '') for name in VARY_HEADERS)])
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def _set_headers(self, response: Response, etag: str) -> None:
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.vary.update(VARY_HEADERS)
+
+    def check_not_modified(self) -> Optional[Response]:
+        """
+        Before-request hook: answers 304 if the client already has the current response.
+        """
+        etag = g.etag = self.etag()
+        if etag is not None and request.if_none_match.contains(etag):
+            response = Response(status=304)
+            self._set_headers(response, etag)
+            return response
+        return None
+
+    def add_cache_headers(self, response: Response) -> Response:
+        """
+        After-request hook: adds the ETag and caching headers to successful responses.
+        """
+        etag = g.get('etag')
+        if etag is not None and response.status_code == 200:
+            self._set_headers(response, etag)
+        return response
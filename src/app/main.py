@@ -1,20 +1,69 @@
+import time
+STARTED = time.perf_counter()  # Taken before the other imports, for the startup report
+
 from flask.wrappers import Request
 from flask import jsonify
 from flask import request
 from typing import Union
 from typing import Tuple
+from flask import Response
 from flask import Flask
 from typing import Dict 
 from typing import List
+from search import search_accounts_by_name
+from search import INDEXED_SEARCH_SQL
+from snapshot import AccountSnapshot
+from snapshot import DEFAULT_MAX_BYTES as SNAPSHOT_MAX_BYTES
+from search import parse_page_args
+from pagination import parse_keyset_args
+from pagination import NDJSON_MIMETYPE
+from pagination import stream_accounts
+from pagination import next_page_link
+from pagination import MAX_PAGE_LIMIT
+from pagination import page_accounts
+from pagination import wants_ndjson
+from pagination import PAGE_SQL
+from serialize import json_response
+from serialize import dumps_rows
+from serialize import Payload
+from serialize import dumps
+from http_cache import ConditionalCache
+from result_cache import ResultCache
+from result_cache import cache_key
+from startup import StartupReport
+from metrics import init_app as init_metrics
+from metrics import observe_sql
+from db import ConnectionPool
 import logging
-import sqlite3
 import flask 
-import json 
 import sys
+import os
 
+# Modules used only by the fuzzy search, filter, stats and batch routes are imported
+# inside those routes, so a cold start does not pay for them.
 
 app = Flask(__name__)
 
+# Request counters and latency histograms at /metrics; registered first so every request is timed
+init_metrics(app)
+
+# Static variable for database path
+DATABASE_PATH = 'sales.db'
+
+# The database is opened read-only and memory-mapped. Only the deployment (deploy.ipynb), where
+# sales.db is a read-only artifact, sets SALES_DB_IMMUTABLE=1 to also skip locking and change checks
+IMMUTABLE = os.environ.get('SALES_DB_IMMUTABLE', '0') == '1'
+PREWARM = os.environ.get('SALES_PREWARM', '1') == '1'
+
+# Statements compiled on every pooled connection at startup
+WARM_STATEMENTS = [
+    ('SELECT id, name, industry, region, status FROM accounts', ()),
+    ('SELECT * FROM accounts WHERE id = ?', ('',)),
+    (PAGE_SQL, ('', 1)),
+    ("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'accounts_fts'", ()),
+    (INDEXED_SEARCH_SQL, ('', 1, 0)),
+]
+
 # Setup logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
@@ -24,6 +73,63 @@ logging.basicConfig(level=logging.INFO,
 # Log versions of dependencies 
 logger.info(f'Using flask=={flask.__version__}')
 
+startup = StartupReport(STARTED)
+startup.mark('imports')
+
+# Shared pool of read-only connections, reused across requests
+pool = ConnectionPool(DATABASE_PATH, immutable=IMMUTABLE, observer=observe_sql)
+
+# Optional sharded storage written by `db_setup.py --shards`; every account route (list, lookup,
+# substring and fuzzy search, filter, export, stats, batch and context) then queries the shards
+# instead of DATABASE_PATH
+SHARD_MANIFEST = os.environ.get('SALES_SHARD_MANIFEST', '')
+shards = None
+if SHARD_MANIFEST:
+    from shards import ShardedAccounts
+    shards = ShardedAccounts(SHARD_MANIFEST, immutable=IMMUTABLE, observer=observe_sql)
+
+# Version of the database file(s), shared by the snapshot and the HTTP cache headers
+versions = shards.versions if shards is not None else pool.versions
+
+# Optional in-memory copy of the accounts table; None from current() means use SQL (always, when sharded)
+snapshot = AccountSnapshot(DATABASE_PATH, max_bytes=0 if shards is not None else SNAPSHOT_MAX_BYTES,
+                           versions=versions)
+
+# Search results, shared by identical concurrent requests and dropped when the database changes
+search_results = ResultCache(versions, 'search')
+
+# ETag, Cache-Control and 304 Not Modified for the read-only routes
+ConditionalCache(versions, ['get_accounts', 'get_account', 'search_accounts', 'filter_accounts_route',
+                            'account_stats_route', 'account_context_route', 'export_accounts_route']).init_app(app)
+
+# Pre-warm page cache, connections, statements and snapshot at import, not on the first request
+if PREWARM:
+    try:
+        pool.warm(WARM_STATEMENTS)
+        startup.mark('warm_connections')
+        snapshot.current()
+        startup.mark('load_snapshot')
+    except Exception as e:
+        logger.warning(f'Pre-warming failed, the first requests will start cold: {e}')
+startup.log()
+
+
+@app.before_request
+def time_first_request() -> None:
+    """
+    Starts the first-request timer of the startup report.
+    """
+    startup.request_started()
+
+
+@app.after_request
+def report_first_request(response: Response) -> Response:
+    """
+    Stops the first-request timer of the startup report.
+    """
+    startup.request_finished(request.path)
+    return response
+
 
 @app.route('/')
 def home() -> str:
@@ -41,17 +147,41 @@ def get_accounts() -> Tuple[Dict[str, Union[str, List[Dict[str, Union[str, int]]
     """
     Retrieve all accounts from the database.
 
+    With `limit` and/or `after`, returns one page ordered by `id`, starting after the `after` id,
+    with a `Link` header pointing at the next page. With `Accept: application/x-ndjson`, streams
+    the accounts as newline-delimited JSON in constant memory.
+
     Returns:
         Tuple[Dict[str, Union[str, List[Dict[str, Union[str, int]]]]], int]: JSON response with accounts and status code.
     """
     try:
-        conn = sqlite3.connect('sales.db')
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('SELECT id, name, industry, region, status FROM accounts')
-        accounts = c.fetchall()
-        conn.close()
-        return jsonify([dict(account) for account in accounts]), 200
+        after, limit = parse_keyset_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if wants_ndjson(request.accept_mimetypes):
+            if shards is not None:
+                return Response(shards.stream(after, limit), mimetype=NDJSON_MIMETYPE), 200
+            return Response(stream_accounts(snapshot, pool, after, limit), mimetype=NDJSON_MIMETYPE), 200
+        if after is not None or limit is not None:
+            limit = limit or MAX_PAGE_LIMIT
+            if shards is not None:
+                page = shards.page(after, limit)
+            else:
+                page = page_accounts(snapshot, pool, after, limit)
+            response = json_response(dumps(page))
+            link = next_page_link(request.path, page, limit)
+            if link:
+                response.headers['Link'] = link
+            return response, 200
+        if shards is not None:
+            return json_response(dumps(shards.page(None, None))), 200
+        # The full list is serialized and compressed once per snapshot, not per request
+        payload = snapshot.derived('accounts_json', lambda data: Payload(dumps(data.accounts)))
+        if payload is not None:
+            return json_response(payload), 200
+        accounts = pool.fetch_all('SELECT id, name, industry, region, status FROM accounts')
+        return json_response(dumps_rows(accounts)), 200
     except Exception as e:
         logger.error(f"Error retrieving accounts: {e}")
         return jsonify({'error': 'Internal Server Error'}), 500
@@ -69,12 +199,13 @@ def get_account(account_id: str) -> Tuple[Dict[str, Union[str, Dict[str, Union[s
         Tuple[Dict[str, Union[str, Dict[str, Union[str, int]]]], int]: JSON response with the account and status code.
     """
     try:
-        conn = sqlite3.connect('sales.db')
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('SELECT * FROM accounts WHERE id = ?', (account_id,))
-        account = c.fetchone()
-        conn.close()
+        data = snapshot.current()
+        if data is not None:
+            account = data.by_id.get(account_id)
+        elif shards is not None:
+            account = shards.get_account(account_id)
+        else:
+            account = pool.fetch_one('SELECT * FROM accounts WHERE id = ?', (account_id,))
         if account:
             return jsonify(dict(account)), 200
         else:
@@ -89,23 +220,210 @@ def search_accounts() -> Tuple[Dict[str, Union[str, List[Dict[str, Union[str, in
     """
     Search for accounts by name (partial or exact string match).
 
+    Query parameters `limit` and `offset` page through the matches. With `mode=fuzzy` the
+    search tolerates typos instead and returns the `limit` closest names, best first, each
+    with a similarity `score`.
+
     Returns:
         Tuple[Dict[str, Union[str, List[Dict[str, Union[str, int]]]]], int]: JSON response with the accounts and status code.
     """
+    search_query = request.args.get('name', '')
+    mode = request.args.get('mode', 'substring')
+    if mode not in ('substring', 'fuzzy'):
+        return jsonify({'error': 'mode must be substring or fuzzy'}), 400
+    if mode == 'fuzzy':
+        from fuzzy import search_accounts_fuzzy, DEFAULT_FUZZY_LIMIT, MAX_FUZZY_LIMIT
+    try:
+        if mode == 'fuzzy':
+            limit, offset = parse_page_args(request.args, DEFAULT_FUZZY_LIMIT, MAX_FUZZY_LIMIT)
+        else:
+            limit, offset = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    key = cache_key('search_accounts', name=search_query, mode=mode, limit=limit, offset=offset)
     try:
-        search_query = request.args.get('name', '')
-        conn = sqlite3.connect('sales.db')
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM accounts WHERE name LIKE '%' || ? || '%'", (search_query,))
-        accounts = c.fetchall()
-        conn.close()
-        return jsonify([dict(account) for account in accounts]), 200
+        if mode == 'fuzzy' and shards is not None:
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps(shards.fuzzy(search_query, limit))))
+        elif mode == 'fuzzy':
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps(search_accounts_fuzzy(snapshot, pool, search_query, limit))))
+        elif shards is not None:
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps(shards.search(search_query, limit, offset))))
+        else:
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps_rows(search_accounts_by_name(pool, search_query, limit, offset))))
+        return json_response(payload), 200
     except Exception as e:
         logger.error(f"Error searching for accounts with query '{search_query}': {e}")
         return jsonify({'error': 'Internal Server Error'}), 500
 
 
+@app.route('/api/accounts/filter', methods=['GET'])
+def filter_accounts_route() -> Tuple[Dict[str, Union[str, List[Dict[str, Union[str, int]]]]], int]:
+    """
+    Filter accounts on any combination of `industry`, `region` and `status` (case-insensitive exact match).
+
+    Query parameters `limit` and `offset` page through the matches.
+
+    Returns:
+        Tuple[Dict[str, Union[str, List[Dict[str, Union[str, int]]]]], int]: JSON response with the accounts and status code.
+    """
+    from filters import filter_accounts, parse_filters
+    filters = parse_filters(request.args)
+    try:
+        limit, offset = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if shards is not None:
+            return json_response(dumps(shards.filter(filters, limit, offset))), 200
+        return json_response(dumps(filter_accounts(snapshot, pool, filters, limit, offset))), 200
+    except Exception as e:
+        logger.error(f"Error filtering accounts with {filters}: {e}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+@app.route('/api/accounts/export', methods=['GET'])
+def export_accounts_route() -> Tuple[Response, int]:
+    """
+    Stream accounts in a compact columnar format for bulk analysis.
+
+    `columns` picks a comma-separated subset of the account columns, and `industry`, `region`
+    and `status` filter as on /api/accounts/filter. The body is an Arrow IPC stream when
+    pyarrow is installed and the client asks for it (`format=arrow` or `Accept:
+    application/vnd.apache.arrow.stream`), and column-oriented JSON with dictionary-encoded
+    low-cardinality columns otherwise.
+
+    Returns:
+        Tuple[Response, int]: The streamed export and status code.
+    """
+    from export import export_accounts, negotiate_format, parse_columns, ARROW_MIMETYPE, COLUMNAR_JSON_MIMETYPE
+    from filters import parse_filters
+    try:
+        columns = parse_columns(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        fmt = negotiate_format(request.args, request.accept_mimetypes)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 406
+    filters = parse_filters(request.args)
+    try:
+        chunks = export_accounts(snapshot, shards.pools if shards is not None else [pool], columns, filters, fmt)
+        return Response(chunks, mimetype=ARROW_MIMETYPE if fmt == 'arrow' else COLUMNAR_JSON_MIMETYPE), 200
+    except Exception as e:
+        logger.error(f"Error exporting accounts with {filters}: {e}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+@app.route('/api/accounts/stats', methods=['GET'])
+def account_stats_route() -> Tuple[Dict[str, Union[str, int, List[Dict[str, Union[str, int]]]]], int]:
+    """
+    Count accounts, optionally filtered by `industry`, `region` and `status` and grouped by
+    any comma-separated subset of those columns in `group_by`.
+
+    Returns:
+        Tuple[Dict[str, Union[str, int, List[Dict[str, Union[str, int]]]]], int]: JSON response with the total, the per-group counts and status code.
+    """
+    from stats import account_stats, parse_group_by
+    from filters import parse_filters
+    filters = parse_filters(request.args)
+    try:
+        group_by = parse_group_by(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if shards is not None:
+            return jsonify(shards.stats(group_by, filters)), 200
+        return jsonify(account_stats(pool, group_by, filters)), 200
+    except Exception as e:
+        logger.error(f"Error computing account stats for {filters} grouped by {group_by}: {e}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+@app.route('/api/accounts/batch', methods=['POST'])
+def get_accounts_batch() -> Tuple[Dict[str, Union[str, List]], int]:
+    """
+    Retrieve many accounts by ID in one request.
+
+    The JSON body is {"ids": [...]}; at most SALES_BATCH_MAX_IDS distinct IDs are accepted.
+
+    Returns:
+        Tuple[Dict[str, Union[str, List]], int]: JSON response with the found `accounts`, the `missing` IDs and status code.
+    """
+    from batch import get_accounts_by_ids, parse_batch_ids
+    try:
+        ids = parse_batch_ids(request.get_json(force=True, silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+    try:
+        if shards is not None:
+            return jsonify(shards.get_many(ids)), 200
+        return jsonify(get_accounts_by_ids(snapshot, pool, ids)), 200
+    except Exception as e:
+        logger.error(f"Error retrieving {len(ids)} accounts by ID: {e}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+@app.route('/api/accounts/context', methods=['GET'])
+def account_context_route() -> Tuple[Dict[str, Union[str, List[Dict]]], int]:
+    """
+    Resolve an account ID or name to the full account record plus its portfolio, sales and activity URLs.
+
+    The `query` parameter is tried as an account ID first, then as a (partial) name; a name
+    returns up to `limit` matching accounts, exact names first. This answers in one call what
+    otherwise takes a search, a lookup and three URL requests.
+
+    Returns:
+        Tuple[Dict[str, Union[str, List[Dict]]], int]: JSON response with the `query`, how it matched and the `accounts`, and status code.
+    """
+    from context import account_contexts, DEFAULT_CONTEXT_MATCHES, MAX_CONTEXT_MATCHES
+    query = request.args.get('query', '').strip()
+    if not query:
+        return jsonify({'error': 'query is required'}), 400
+    try:
+        limit, _ = parse_page_args(request.args, DEFAULT_CONTEXT_MATCHES, MAX_CONTEXT_MATCHES)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        context = account_contexts(snapshot, pool, [query], limit, shards)[0]
+        if not context['accounts']:
+            return jsonify({'error': 'Account not found'}), 404
+        return json_response(dumps(context)), 200
+    except Exception as e:
+        logger.error(f"Error resolving account context for '{query}': {e}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+@app.route('/api/accounts/context/batch', methods=['POST'])
+def account_context_batch() -> Tuple[Dict[str, Union[str, List[Dict]]], int]:
+    """
+    Resolve several account IDs or names at once, as /api/accounts/context does for one.
+
+    The JSON body is {"queries": [...]}; at most SALES_CONTEXT_MAX_QUERIES distinct queries are accepted.
+
+    Returns:
+        Tuple[Dict[str, Union[str, List[Dict]]], int]: JSON response with one context per query in `results`, and status code.
+    """
+    from context import account_contexts, parse_context_queries, DEFAULT_CONTEXT_MATCHES, MAX_CONTEXT_MATCHES
+    try:
+        queries = parse_context_queries(request.get_json(force=True, silent=True))
+        limit, _ = parse_page_args(request.args, DEFAULT_CONTEXT_MATCHES, MAX_CONTEXT_MATCHES)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+    try:
+        return json_response(dumps({'results': account_contexts(snapshot, pool, queries, limit, shards)})), 200
+    except Exception as e:
+        logger.error(f"Error resolving account context for {len(queries)} queries: {e}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
 @app.route('/api/accounts/url', methods=['POST'])
 def generate_account_url() -> Tuple[Dict, int]:
     """ 
@@ -114,17 +432,11 @@ def generate_account_url() -> Tuple[Dict, int]:
     Returns:
         A JSON object with the generated URL and a HTTP status code.
     """
+    from context import ACCOUNT_URL_BASES
     try:
-        # Log the incoming request for debugging purposes
-        app.logger.info('Received request: %s', request.data)
-        app.logger.info('Request headers: %s', request.headers)
-
         # Parse JSON data from the request
         data = request.get_json(force=True)
 
-        # Log parsed data for debugging purposes
-        app.logger.info('Parsed data: %s', data)
-
         # Extract account_id and account_type
         account_id = data.get('account_id')
         account_type = data.get('account_type')
@@ -133,15 +445,8 @@ def generate_account_url() -> Tuple[Dict, int]:
         if not account_id or not account_type:
             return jsonify({'error': 'account_id and account_type are required'}), 400
 
-        # Define base URL parts
-        base_urls = {
-            'portfolio': 'https://sales.com/portfolio/accounts/',
-            'sales': 'https://sales.com/sales/accounts/',
-            'activity': 'https://sales.com/activity/accounts/'
-        }
-
         # Get the appropriate base URL
-        base_url = base_urls.get(account_type.lower())
+        base_url = ACCOUNT_URL_BASES.get(account_type.lower())
         if not base_url:
             return jsonify({'error': 'Invalid account_type'}), 400
 
@@ -149,7 +454,7 @@ def generate_account_url() -> Tuple[Dict, int]:
         full_url = f"{base_url}{account_id}"
 
         # Log generated URL for debugging purposes
-        app.logger.info('Generated URL: %s', full_url)
+        app.logger.debug('Generated URL: %s', full_url)
 
         return jsonify({'url': full_url}), 200
 
@@ -158,29 +463,37 @@ def generate_account_url() -> Tuple[Dict, int]:
         return jsonify({'error': str(e)}), 500
 
 
-def sales(request: Request) -> Tuple[Dict[str, str], int]:
+@app.route('/api/startup', methods=['GET'])
+def startup_report() -> Tuple[Dict, int]:
+    """
+    Report how long this instance took to start, phase by phase, and how long its first request took.
+
+    Returns:
+        Tuple[Dict, int]: JSON response with the startup report and status code.
+    """
+    return jsonify(startup.as_dict()), 200
+
+
+def sales(request: Request) -> Response:
     """
     Entry point for the Cloud Function to process a request and return a response.
 
+    The incoming WSGI environ is handed straight to the Flask app, so the request is
+    not re-parsed or copied and goes through Flask's normal routing, error handling
+    and response finalization.
+
     Args:
         request (Request): The Flask request object.
 
     Returns:
-        Tuple[Dict[str, str], int]: JSON response and status code.
-    """
-    logger.info(f'Request method: {request.method}')
-    logger.info(f'Request headers: {request.headers}')
-    logger.info(f'Request data: {request.data}')
-
-    with app.test_request_context(path=request.full_path, method=request.method, data=request.data):
-        try:
-            # Manually dispatch the Flask request
-            response = app.dispatch_request()
-            logger.info(f'Response: {response}')
-            return response
-        except Exception as e:
-            # Handle exceptions that might occur during dispatch
-            logger.error(f"Error processing request: {e}")
-            return jsonify({'error': str(e)}), 500
+        Response: The Flask app's response.
+    """
+    logger.debug('%s %s', request.method, request.full_path)
+    try:
+        return app.response_class.from_app(app.wsgi_app, request.environ)
+    except Exception as e:
+        # Handle exceptions that might occur outside of Flask's own error handling
+        logger.error(f"Error processing request: {e}")
+        return jsonify({'error': str(e)}), 500
 
 # No app.run() needed; Cloud Functions handle the server setup.
\ No newline at end of file
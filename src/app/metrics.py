@@ -0,0 +1,209 @@
+from flask.json.provider import DefaultJSONProvider
+from contextlib import contextmanager
+from typing import Iterator
+from typing import Sequence
+from typing import Optional
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from flask import Response
+from flask import request
+from flask import Flask
+from flask import g
+import threading
+import bisect
+import time
+import re
+
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow scans
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# SQL literals, replaced by '?' so statement labels do not depend on the values bound
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_PLACEHOLDER_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    A monotonically increasing count, per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {_format(value)}')
+        return lines
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets, per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: [count per bucket (last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        """
+        Observes the time spent in the `with` block.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted((labelvalues, (list(counts), total)) for labelvalues, (counts, total) in self._values.items())
+        for labelvalues, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{_format(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {_format(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """
+    The metrics exposed at `/metrics`.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'sales_http_requests_total', 'HTTP requests handled, by route, method and status.',
+    ('route', 'method', 'status')))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'sales_http_request_duration_seconds', 'Time from dispatch until the response is returned, by route.',
+    ('route',)))
+SQL_DURATION = REGISTRY.register(Histogram(
+    'sales_sql_statement_duration_seconds',
+    'Time from a SQL statement starting until the next statement or the connection is released, by statement.',
+    ('statement',)))
+SERIALIZATION_DURATION = REGISTRY.register(Histogram(
+    'sales_serialization_duration_seconds', 'Time spent encoding and compressing response bodies, by stage.',
+    ('stage',)))
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Turns an executed statement back into its parameterized form, e.g. for use as a label.
+
+    SQLite's trace hook reports statements with their parameters expanded, so literals
+    are replaced with '?', lists of placeholders are collapsed and whitespace is squeezed.
+    """
+    sql = _SQL_LITERALS.sub('?', sql)
+    sql = _SQL_PLACEHOLDER_LISTS.sub('?, ...', sql)
+    return ' '.join(sql.split())
+
+
+def observe_sql(sql: str, seconds: float) -> None:
+    """
+    Records one SQL statement's duration; pass as the connection pool's `observer`.
+    """
+    SQL_DURATION.observe(seconds, normalize_sql(sql))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider, timing the encoding done by `jsonify`.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        with SERIALIZATION_DURATION.time('jsonify'):
+            return super().dumps(obj, **kwargs)
+
+
+def init_app(app: Flask, path: str = '/metrics') -> None:
+    """
+    Instruments a Flask app and serves its metrics at `path`.
+
+    Register this before other request hooks, so requests answered early by
+    another hook (e.g. a 304) are still timed.
+    """
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        started: Optional[float] = g.get('metrics_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - started, route)
+            REQUESTS.inc(route, request.method, str(response.status_code))
+        return response
+
+    @app.route(path, methods=['GET'])
+    def metrics() -> Response:
+        return Response(REGISTRY.render(), content_type=PROMETHEUS_MIMETYPE)
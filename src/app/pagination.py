@@ -0,0 +1,140 @@
+from typing import Iterator
+from typing import Optional
+from typing import Mapping
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from snapshot import AccountSnapshot
+from snapshot import ACCOUNT_COLUMNS
+from snapshot import AccountData
+from urllib.parse import urlencode
+from serialize import dumps_lines
+from db import ConnectionPool
+import bisect
+import os
+
+
+# Page and stream settings, overridable through the environment
+MAX_PAGE_LIMIT = int(os.environ.get('SALES_PAGE_MAX_LIMIT', '1000'))
+STREAM_CHUNK_SIZE = int(os.environ.get('SALES_STREAM_CHUNK_SIZE', '500'))
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Keyset page over the primary key index; no OFFSET, so every page costs the same
+PAGE_SQL = f'''
+    SELECT {", ".join(ACCOUNT_COLUMNS)}
+    FROM accounts
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+'''
+
+
+def parse_keyset_args(args: Mapping[str, str]) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Reads and validates the `after` and `limit` query parameters.
+
+    Args:
+        args (Mapping[str, str]): The request's query parameters.
+
+    Returns:
+        Tuple[Optional[str], Optional[int]]: The cursor and page size; None when not given.
+
+    Raises:
+        ValueError: If the limit is not an integer between 1 and MAX_PAGE_LIMIT.
+    """
+    after = args.get('after')
+    limit = args.get('limit')
+    if limit is None:
+        return after, None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_LIMIT}')
+    return after, limit
+
+
+def _sorted_ids(data: AccountData) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Orders the snapshot by `id` for binary search.
+    """
+    accounts = sorted(data.accounts, key=lambda account: account['id'])
+    return [account['id'] for account in accounts], accounts
+
+
+def page_accounts(snapshot: AccountSnapshot, pool: ConnectionPool, after: Optional[str],
+                  limit: int) -> List[Dict[str, Any]]:
+    """
+    Returns up to `limit` accounts with an `id` greater than `after`, in `id` order.
+
+    Served by binary search over the snapshot when it is loaded, and by a keyset
+    query on the primary key otherwise.
+
+    Args:
+        snapshot (AccountSnapshot): In-memory accounts, if available.
+        pool (ConnectionPool): Pool used when there is no snapshot.
+        after (Optional[str]): Last `id` of the previous page, or None for the first page.
+        limit (int): Page size.
+
+    Returns:
+        List[Dict[str, Any]]: The page of accounts.
+    """
+    index = snapshot.derived('sorted_ids', _sorted_ids)
+    if index is not None:
+        ids, accounts = index
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        return accounts[start:start + limit]
+    return [dict(row) for row in pool.fetch_all(PAGE_SQL, (after if after is not None else '', limit))]
+
+
+def wants_ndjson(accept_mimetypes: Any) -> bool:
+    """
+    Checks whether the client asked for NDJSON over plain JSON in its `Accept` header.
+    """
+    return accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def next_page_link(path: str, page: List[Dict[str, Any]], limit: int) -> Optional[str]:
+    """
+    Builds an RFC 8288 `Link` header pointing at the page after `page`, if there may be one.
+    """
+    if len(page) < limit:
+        return None
+    query = urlencode({'after': page[-1]['id'], 'limit': limit})
+    return f'<{path}?{query}>; rel="next"'
+
+
+def stream_accounts(snapshot: AccountSnapshot, pool: ConnectionPool, after: Optional[str] = None,
+                    limit: Optional[int] = None,
+                    chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields accounts as newline-delimited JSON, one keyset page at a time.
+
+    Each chunk is a separate short query, so a slow consumer never holds a pooled
+    connection and memory stays constant however large the table is.
+
+    Args:
+        snapshot (AccountSnapshot): In-memory accounts, if available.
+        pool (ConnectionPool): Pool used when there is no snapshot.
+        after (Optional[str]): Start after this `id`.
+        limit (Optional[int]): Stop after this many accounts; None streams to the end.
+        chunk_size (int): Accounts fetched and yielded per chunk.
+
+    Yields:
+        bytes: A block of NDJSON lines.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        page = page_accounts(snapshot, pool, after, size)
+        if not page:
+            break
+        yield dumps_lines(page)
+        if len(page) < size:
+            break
+        after = page[-1]['id']
+        if remaining is not None:
+            remaining -= len(page)
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from typing import Hashable
+from typing import Callable
+from typing import Optional
+from typing import TypeVar
+from typing import Tuple
+from typing import Dict
+from typing import Any
+from metrics import REGISTRY
+from metrics import Counter
+from db import DatabaseVersion
+from db import Version
+import threading
+import time
+import os
+
+
+# Result cache settings, overridable through the environment (0 entries disables the cache)
+DEFAULT_MAX_ENTRIES = int(os.environ.get('SALES_RESULT_CACHE_SIZE', '1024'))
+DEFAULT_TTL = float(os.environ.get('SALES_RESULT_CACHE_TTL', '60'))
+
+RESULT_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'sales_result_cache_lookups_total',
+    'Result cache lookups, by cache and result (hit, miss, coalesced or bypass).',
+    ('cache', 'result')))
+RESULT_CACHE_EVICTIONS = REGISTRY.register(Counter(
+    'sales_result_cache_evictions_total',
+    'Result cache entries dropped to stay within the size limit, by cache.',
+    ('cache',)))
+
+T = TypeVar('T')
+
+
+def cache_key(route: str, **params: Any) -> Tuple[Hashable, ...]:
+    """
+    Builds a cache key from a route name and its parsed parameters, independent of their order.
+    """
+    return (route, *sorted(params.items()))
+
+
+class _Flight:
+    """
+    A computation in progress, which concurrent requests for the same key wait on.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """
+    An LRU cache of query results with a TTL, emptied when the database changes.
+
+    `get_or_compute` also coalesces concurrent misses: while one thread runs the query
+    for a key, other threads asking for the same key wait for its result instead of
+    running the query again. Failures are passed to the waiting threads but not cached.
+    Lookups are counted in `sales_result_cache_lookups_total` and `stats()`.
+    """
+
+    def __init__(self, versions: DatabaseVersion, name: str = 'results',
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL) -> None:
+        """
+        Args:
+            versions (DatabaseVersion): Version tracker of the database the results come from.
+            name (str): Label of this cache in the metrics.
+            max_entries (int): Most results kept; the least recently used is evicted first.
+                0 disables caching but still coalesces concurrent requests.
+            ttl (float): Seconds a result is served before it is recomputed.
+        """
+        self.versions = versions
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._version: Optional[Version] = None
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('hit', 'miss', 'coalesced', 'bypass', 'eviction'), 0)
+
+    def _count(self, result: str) -> None:
+        self._stats[result] += 1
+        RESULT_CACHE_LOOKUPS.inc(self.name, result)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        Returns the cached result for `key`, computing it at most once across concurrent callers.
+
+        Args:
+            key (Hashable): The normalized route and parameters, e.g. from `cache_key`.
+            compute (Callable[[], T]): Runs the query; called without the cache lock held.
+
+        Returns:
+            T: The result.
+        """
+        version = self.versions.current()
+        if version is None:
+            # Without a version the results cannot be invalidated, so do not keep them
+            with self._lock:
+                self._count('bypass')
+            return compute()
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._count('hit')
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._count('miss')
+            else:
+                self._count('coalesced')
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and self.max_entries > 0 and version == self._version:
+                    self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self._stats['eviction'] += 1
+                        RESULT_CACHE_EVICTIONS.inc(self.name)
+            flight.done.set()
+        return flight.value
+
+    def clear(self) -> None:
+        """
+        Drops every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the lookup counts by result, the evictions and the current number of entries.
+        """
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries)}
@@ -0,0 +1,113 @@
+from typing import Mapping
+from typing import Tuple
+from typing import List
+from db import ConnectionPool
+import sqlite3
+import os
+
+
+# Result bounds for name searches, overridable through the environment
+DEFAULT_SEARCH_LIMIT = int(os.environ.get('SALES_SEARCH_DEFAULT_LIMIT', '100'))
+MAX_SEARCH_LIMIT = int(os.environ.get('SALES_SEARCH_MAX_LIMIT', '1000'))
+
+# Substring search through the FTS5 trigram index built by db_setup.py. The trigram
+# tokenizer answers LIKE on the indexed column itself, so the semantics (case-insensitive
+# ASCII, % and _ wildcards) are exactly those of the plain LIKE scan below.
+INDEXED_SEARCH_SQL = '''
+    SELECT a.id, a.name, a.industry, a.region, a.status
+    FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid
+    WHERE f.name LIKE '%' || ? || '%'
+    ORDER BY f.rowid
+    LIMIT ? OFFSET ?
+'''
+
+# Full-scan fallback for databases built before the index existed
+SCAN_SEARCH_SQL = '''
+    SELECT id, name, industry, region, status
+    FROM accounts
+    WHERE name LIKE '%' || ? || '%'
+    ORDER BY rowid
+    LIMIT ? OFFSET ?
+'''
+
+# Accounts named exactly `name` (case-insensitive ASCII). LIKE without wildcards lets the
+# trigram index narrow the candidates, and the comparison keeps only exact names even when
+# the name itself contains % or _.
+INDEXED_EXACT_SQL = '''
+    SELECT a.id, a.name, a.industry, a.region, a.status
+    FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid
+    WHERE f.name LIKE ? AND a.name = ? COLLATE NOCASE
+    ORDER BY f.rowid
+    LIMIT ?
+'''
+
+SCAN_EXACT_SQL = '''
+    SELECT id, name, industry, region, status
+    FROM accounts
+    WHERE name = ? COLLATE NOCASE
+    ORDER BY rowid
+    LIMIT ?
+'''
+
+
+def parse_page_args(args: Mapping[str, str], default_limit: int = DEFAULT_SEARCH_LIMIT,
+                    max_limit: int = MAX_SEARCH_LIMIT) -> Tuple[int, int]:
+    """
+    Reads and validates the `limit` and `offset` query parameters.
+
+    Args:
+        args (Mapping[str, str]): The request's query parameters.
+        default_limit (int): Limit used when none is given.
+        max_limit (int): Largest limit a caller may ask for.
+
+    Returns:
+        Tuple[int, int]: The limit and offset.
+
+    Raises:
+        ValueError: If either parameter is not a non-negative integer or the limit is too large.
+    """
+    try:
+        limit = int(args.get('limit', default_limit))
+        offset = int(args.get('offset', 0))
+    except (TypeError, ValueError):
+        raise ValueError('limit and offset must be integers')
+    if limit < 0 or offset < 0:
+        raise ValueError('limit and offset must be non-negative')
+    if limit > max_limit:
+        raise ValueError(f'limit must not exceed {max_limit}')
+    return limit, offset
+
+
+def has_search_index(pool: ConnectionPool) -> bool:
+    """
+    Checks whether the database has the 'accounts_fts' trigram index, once per database version.
+    """
+    return pool.per_version('has_search_index', lambda: pool.fetch_one(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'accounts_fts'") is not None)
+
+
+def search_accounts_by_name(pool: ConnectionPool, name: str, limit: int = DEFAULT_SEARCH_LIMIT,
+                            offset: int = 0) -> List[sqlite3.Row]:
+    """
+    Finds accounts whose name contains `name`, in table order.
+
+    Args:
+        pool (ConnectionPool): Pool to run the query on.
+        name (str): Substring to search for.
+        limit (int): Maximum number of rows to return.
+        offset (int): Number of matching rows to skip.
+
+    Returns:
+        List[sqlite3.Row]: The matching accounts.
+    """
+    sql = INDEXED_SEARCH_SQL if has_search_index(pool) else SCAN_SEARCH_SQL
+    return pool.fetch_all(sql, (name, limit, offset))
+
+
+def find_accounts_by_exact_name(pool: ConnectionPool, name: str, limit: int) -> List[sqlite3.Row]:
+    """
+    Finds up to `limit` accounts named exactly `name`, ignoring ASCII case, in table order.
+    """
+    if has_search_index(pool):
+        return pool.fetch_all(INDEXED_EXACT_SQL, (name, name, limit))
+    return pool.fetch_all(SCAN_EXACT_SQL, (name, limit))
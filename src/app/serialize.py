@@ -0,0 +1,163 @@
+from typing import Optional
+from typing import Sequence
+from typing import Iterable
+from typing import Union
+from typing import Dict
+from typing import Any
+from flask import Response
+from flask import request
+from metrics import SERIALIZATION_DURATION
+import threading
+import sqlite3
+import json
+import gzip
+import os
+
+# Optional accelerators; the stdlib is used when they are not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+JSON_MIMETYPE = 'application/json'
+
+# Compression settings, overridable through the environment
+MIN_COMPRESS_SIZE = int(os.environ.get('SALES_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('SALES_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('SALES_BROTLI_QUALITY', '5'))
+
+# Content codings we can produce, most preferred first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+_encode_str = json.encoder.encode_basestring
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializes `obj` to compact UTF-8 JSON, with orjson when it is installed.
+    """
+    with SERIALIZATION_DURATION.time('dumps'):
+        return _dumps(obj)
+
+
+def _encode_value(value: Any) -> str:
+    return _encode_str(value) if value.__class__ is str else json.dumps(value)
+
+
+def dumps_rows(rows: Sequence[sqlite3.Row]) -> bytes:
+    """
+    Serializes query rows to a JSON array of objects.
+
+    With orjson the rows are zipped into one dict each, which orjson still encodes
+    faster than any pure-Python writer. Without it, no dicts are built: each row is
+    formatted into a template prepared once from the column names, about twice as
+    fast as `json.dumps` over dicts.
+
+    Args:
+        rows (Sequence[sqlite3.Row]): Rows of one query, all with the same columns.
+
+    Returns:
+        bytes: The JSON array.
+    """
+    if not rows:
+        return b'[]'
+    columns = rows[0].keys()
+    with SERIALIZATION_DURATION.time('dumps_rows'):
+        if orjson is not None:
+            return orjson.dumps([dict(zip(columns, row)) for row in rows])
+        template = '{' + ','.join(f'{_encode_str(column)}:%s' for column in columns) + '}'
+        body = ','.join([template % tuple([_encode_value(value) for value in row]) for row in rows])
+        return f'[{body}]'.encode()
+
+
+def dumps_lines(items: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Serializes items as newline-delimited JSON, timed once for the whole batch.
+    """
+    with SERIALIZATION_DURATION.time('dumps_lines'):
+        return b''.join([_dumps(item) + b'\n' for item in items])
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compresses `body` with one of ENCODINGS.
+    """
+    with SERIALIZATION_DURATION.time(encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def negotiate_encoding(accept_encodings: Any, size: int) -> Optional[str]:
+    """
+    Picks the content coding for a body of `size` bytes from the `Accept-Encoding` header.
+
+    Returns:
+        Optional[str]: The coding, or None to send the body uncompressed.
+    """
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    return accept_encodings.best_match(ENCODINGS)
+
+
+class Payload:
+    """
+    A serialized JSON body that is reused across requests, e.g. the full account list.
+
+    Compressed variants are produced on first use and kept alongside the body, so
+    hot payloads are serialized and compressed once per database version.
+    """
+
+    def __init__(self, body: bytes) -> None:
+        """
+        Args:
+            body (bytes): The uncompressed JSON.
+        """
+        self.body = body
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        """
+        Returns the body compressed with `encoding`, compressing it on first use.
+        """
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    body = self._encoded[encoding] = compress(self.body, encoding)
+        return body
+
+
+def json_response(payload: Union[bytes, Payload], status: int = 200) -> Response:
+    """
+    Builds a JSON response from pre-serialized bytes, compressed if the client accepts it.
+
+    Args:
+        payload (Union[bytes, Payload]): The JSON body, or a cached payload.
+        status (int): HTTP status code.
+
+    Returns:
+        Response: The response, with `Content-Encoding` and `Vary: Accept-Encoding` set.
+    """
+    body = payload.body if isinstance(payload, Payload) else payload
+    encoding = negotiate_encoding(request.accept_encodings, len(body))
+    if encoding is not None:
+        body = payload.encoded(encoding) if isinstance(payload, Payload) else compress(body, encoding)
+    response = Response(body, status=status, mimetype=JSON_MIMETYPE)
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,58 @@
+from typing import Dict
+from typing import Any
+import json
+import zlib
+import re
+import os
+
+
+# How accounts are assigned to shards: by a hash of `id`, or one shard per region
+SHARD_BY = ('hash', 'region')
+
+
+def shard_for_id(account_id: str, count: int) -> int:
+    """
+    Returns the shard of an account under hash sharding; stable across processes and Python versions.
+    """
+    return zlib.crc32(account_id.encode()) % count
+
+
+def shard_key(region: str) -> str:
+    """
+    Turns a region into the file name part of its shard, e.g. 'North America' -> 'north-america'.
+    """
+    return re.sub(r'[^a-z0-9]+', '-', region.casefold()).strip('-') or 'unknown'
+
+
+def manifest_path(database_path: str) -> str:
+    """
+    Path of the shard manifest written alongside `database_path`, e.g. 'sales.shards.json'.
+    """
+    return f'{os.path.splitext(database_path)[0]}.shards.json'
+
+
+def shard_path(database_path: str, key: Any) -> str:
+    """
+    Path of one shard's database file, e.g. 'sales-shard-0.db' or 'sales-shard-europe.db'.
+    """
+    base, ext = os.path.splitext(database_path)
+    return f'{base}-shard-{key}{ext or ".db"}'
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """
+    Reads a shard manifest written by `db_setup.py --shards`.
+
+    Returns:
+        Dict[str, Any]: `shard_by` ('hash' or 'region') and `shards`, a list of {"path", "region"}
+            entries with paths relative to the manifest. Under hash sharding, shard `i` of the
+            list holds the accounts for which `shard_for_id(id, len(shards)) == i`.
+
+    Raises:
+        ValueError: If the manifest is malformed.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('shard_by') not in SHARD_BY or not manifest.get('shards'):
+        raise ValueError(f"'{path}' is not a valid shard manifest")
+    return manifest
@@ -0,0 +1,304 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from itertools import islice
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+from typing import Mapping
+from typing import TypeVar
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from snapshot import ACCOUNT_COLUMNS
+from pagination import STREAM_CHUNK_SIZE
+from pagination import PAGE_SQL
+from serialize import dumps_lines
+from batch import fetch_accounts_by_ids
+from batch import batch_result
+from fuzzy import DEFAULT_FUZZY_LIMIT
+from fuzzy import fts_search
+from stats import account_stats
+from shard_layout import read_manifest
+from shard_layout import shard_for_id
+from filters import nocase
+from db import DatabaseVersion
+from db import ConnectionPool
+from db import DEFAULT_POOL_SIZE
+from db import QueryObserver
+import threading
+import operator
+import hashlib
+import logging
+import heapq
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# Threads running the per-shard queries of one fan-out, overridable through the environment
+DEFAULT_FAN_OUT_WORKERS = int(os.environ.get('SALES_SHARD_WORKERS', '8'))
+
+ACCOUNT_SQL = f'SELECT {", ".join(ACCOUNT_COLUMNS)} FROM accounts WHERE id = ?'
+
+# Substring search through each shard's trigram index, in `id` order so results can be merged
+SHARD_SEARCH_SQL = f'''
+    SELECT {", ".join(f"a.{column}" for column in ACCOUNT_COLUMNS)}
+    FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid
+    WHERE f.name LIKE '%' || ? || '%'
+    ORDER BY a.id
+    LIMIT ?
+'''
+
+# Accounts named exactly `name` (case-insensitive), narrowed through the trigram index; see search.py
+SHARD_EXACT_SQL = f'''
+    SELECT {", ".join(f"a.{column}" for column in ACCOUNT_COLUMNS)}
+    FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid
+    WHERE f.name LIKE ? AND a.name = ? COLLATE NOCASE
+    ORDER BY a.id
+    LIMIT ?
+'''
+
+# Full listing of a shard, in `id` order
+ALL_ACCOUNTS_SQL = f'SELECT {", ".join(ACCOUNT_COLUMNS)} FROM accounts ORDER BY id'
+
+_by_id = operator.itemgetter('id')
+_by_score = operator.itemgetter('score')
+
+T = TypeVar('T')
+
+
+class ShardVersions:
+    """
+    The combined version of every shard, usable wherever a `DatabaseVersion` is expected.
+    """
+
+    def __init__(self, versions: List[DatabaseVersion]) -> None:
+        self.versions = versions
+
+    def current(self) -> Optional[Tuple[Any, ...]]:
+        """
+        Returns the tuple of shard versions, or None if any shard cannot be read.
+        """
+        current = tuple(versions.current() for versions in self.versions)
+        return None if None in current else current
+
+    def token(self) -> Optional[str]:
+        """
+        Returns the combined version as a short opaque string, e.g. for ETags and cache keys.
+        """
+        tokens = [versions.token() for versions in self.versions]
+        if None in tokens:
+            return None
+        return hashlib.blake2b('\n'.join(tokens).encode(), digest_size=16).hexdigest()
+
+    def close(self) -> None:
+        for versions in self.versions:
+            versions.close()
+
+
+class ShardedAccounts:
+    """
+    Accounts partitioned across several SQLite files, as written by `db_setup.py --shards`.
+
+    Each shard has its own connection pool. Under hash sharding an ID lookup goes straight
+    to the one shard that can hold it; under region sharding it is asked of every shard.
+    Listing, search and filter queries run on all shards in parallel on a thread pool, each
+    returning its matches in `id` order, and the sorted results are merged with a heap. A
+    `region` filter only queries the shards that can contain that region. Batch lookups,
+    counts and fuzzy search fan out the same way and combine the per-shard answers.
+    """
+
+    def __init__(self, manifest: str, pool_size: int = DEFAULT_POOL_SIZE,
+                 max_workers: int = DEFAULT_FAN_OUT_WORKERS, immutable: bool = False,
+                 observer: Optional[QueryObserver] = None) -> None:
+        """
+        Args:
+            manifest (str): Path to the shard manifest.
+            pool_size (int): Connections per shard.
+            max_workers (int): Most shard queries run at once across all fan-outs.
+            immutable (bool): Open the shards with `immutable=1`; see `ConnectionPool`.
+            observer (Optional[QueryObserver]): Receives every statement run on a shard.
+        """
+        config = read_manifest(manifest)
+        root = os.path.dirname(os.path.abspath(manifest))
+        self.shard_by: str = config['shard_by']
+        self.paths = [os.path.join(root, shard['path']) for shard in config['shards']]
+        self.regions: List[Optional[str]] = [shard.get('region') for shard in config['shards']]
+        self.pools = [ConnectionPool(path, size=pool_size, immutable=immutable, observer=observer)
+                      for path in self.paths]
+        self.versions = ShardVersions([pool.versions for pool in self.pools])
+        self.max_workers = max(1, min(max_workers, len(self.pools) * pool_size))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        logger.info(f'Using {len(self.pools)} account shards by {self.shard_by}.')
+
+    def _fan_out(self, query: Callable[[ConnectionPool], T],
+                 pools: Optional[List[ConnectionPool]] = None) -> List[T]:
+        """
+        Runs `query` on each shard's pool in parallel and returns the results in shard order.
+        """
+        pools = self.pools if pools is None else pools
+        if len(pools) == 1:
+            return [query(pools[0])]
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sales-shard')
+                executor = self._executor
+        return list(executor.map(query, pools))
+
+    def _fetch(self, sql: str, params: Tuple[Any, ...],
+               pools: Optional[List[ConnectionPool]] = None) -> List[List[Dict[str, Any]]]:
+        return self._fan_out(lambda pool: [dict(row) for row in pool.fetch_all(sql, params)], pools)
+
+    @staticmethod
+    def _merge(results: List[List[Dict[str, Any]]], limit: Optional[int] = None,
+               offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Merges per-shard results, each sorted by `id`, into one page in `id` order.
+        """
+        merged = heapq.merge(*results, key=_by_id)
+        return list(islice(merged, offset, None if limit is None else offset + limit))
+
+    def _pools_for(self, filters: Mapping[str, str]) -> List[ConnectionPool]:
+        """
+        Skips shards that cannot match a `region` filter under region sharding.
+        """
+        region = filters.get('region')
+        if self.shard_by != 'region' or not region:
+            return self.pools
+        region = nocase(region)
+        return [pool for pool, shard_region in zip(self.pools, self.regions)
+                if shard_region is None or nocase(shard_region) == region]
+
+    def get_account(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Looks up one account by ID in the shard that owns it.
+        """
+        if self.shard_by == 'hash':
+            row = self.pools[shard_for_id(account_id, len(self.pools))].fetch_one(ACCOUNT_SQL, (account_id,))
+            return dict(row) if row is not None else None
+        for rows in self._fetch(ACCOUNT_SQL, (account_id,)):
+            if rows:
+                return rows[0]
+        return None
+
+    def page(self, after: Optional[str], limit: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        Returns up to `limit` accounts with an `id` greater than `after`, in `id` order.
+
+        Args:
+            after (Optional[str]): Last `id` of the previous page, or None for the first page.
+            limit (Optional[int]): Page size; None returns every account.
+
+        Returns:
+            List[Dict[str, Any]]: The page of accounts.
+        """
+        if after is None and limit is None:
+            return self._merge(self._fetch(ALL_ACCOUNTS_SQL, ()))
+        params = (after if after is not None else '', limit if limit is not None else -1)
+        return self._merge(self._fetch(PAGE_SQL, params), limit)
+
+    def stream(self, after: Optional[str] = None, limit: Optional[int] = None,
+               chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Yields accounts as newline-delimited JSON in `id` order, one merged keyset page at a time.
+        """
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            page = self.page(after, size)
+            if not page:
+                break
+            yield dumps_lines(page)
+            if len(page) < size:
+                break
+            after = page[-1]['id']
+            if remaining is not None:
+                remaining -= len(page)
+
+    def search(self, name: str, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Finds accounts whose name contains `name`, in `id` order.
+
+        Each shard returns its first `offset + limit` matches, which always include its
+        share of the requested page.
+        """
+        return self._merge(self._fetch(SHARD_SEARCH_SQL, (name, offset + limit)), limit, offset)
+
+    def exact(self, name: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Finds up to `limit` accounts named exactly `name` (case-insensitive), in `id` order.
+        """
+        return self._merge(self._fetch(SHARD_EXACT_SQL, (name, name, limit)), limit)
+
+    def filter(self, filters: Mapping[str, str], limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Returns the accounts matching every filter (case-insensitive), in `id` order.
+        """
+        where = ' AND '.join(f'{column} = ? COLLATE NOCASE' for column in filters) or '1'
+        sql = f'SELECT {", ".join(ACCOUNT_COLUMNS)} FROM accounts WHERE {where} ORDER BY id LIMIT ?'
+        results = self._fetch(sql, (*filters.values(), offset + limit), self._pools_for(filters))
+        return self._merge(results, limit, offset)
+
+    def get_many(self, ids: List[str]) -> Dict[str, List[Any]]:
+        """
+        Resolves many account IDs at once, as `batch.get_accounts_by_ids` does for one database.
+
+        Under hash sharding each shard is only asked for the IDs it owns.
+        """
+        if self.shard_by == 'hash':
+            owned: Dict[int, List[str]] = defaultdict(list)
+            for account_id in ids:
+                owned[shard_for_id(account_id, len(self.pools))].append(account_id)
+            wanted = {self.pools[shard]: shard_ids for shard, shard_ids in owned.items()}
+        else:
+            wanted = dict.fromkeys(self.pools, ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        if wanted:
+            for accounts in self._fan_out(lambda pool: fetch_accounts_by_ids(pool, wanted[pool]), list(wanted)):
+                found.update(accounts)
+        return batch_result(ids, found)
+
+    def stats(self, group_by: List[str], filters: Mapping[str, str]) -> Dict[str, Any]:
+        """
+        Counts the accounts matching `filters`, grouped by `group_by`, as `stats.account_stats` does.
+
+        Each shard counts its own accounts from its summary table, and the counts of
+        equal groups are added up.
+        """
+        counts: Dict[Tuple[Any, ...], int] = defaultdict(int)
+        for result in self._fan_out(lambda pool: account_stats(pool, group_by, filters), self._pools_for(filters)):
+            if not group_by:
+                counts[()] += result['total']
+            for group in result['groups']:
+                counts[tuple(group[column] for column in group_by)] += group['count']
+        groups = [{**dict(zip(group_by, values)), 'count': count} for values, count in counts.items() if count]
+        # SQLite's order: count descending, then the group values with NULL first
+        groups.sort(key=lambda group: (-group['count'], [(group[column] is not None, group[column])
+                                                         for column in group_by]))
+        return {
+            'total': sum(group['count'] for group in groups),
+            'groups': groups if group_by else [],
+        }
+
+    def fuzzy(self, query: str, limit: int = DEFAULT_FUZZY_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Typo-tolerant name search: each shard ranks its own FTS5 candidates and the best `limit` are kept.
+        """
+        results = self._fan_out(lambda pool: fts_search(pool, query, limit))
+        return heapq.nlargest(limit, (account for accounts in results for account in accounts), key=_by_score)
+
+    def close(self) -> None:
+        """
+        Closes every shard's connections and stops the fan-out threads; both are reopened on next use.
+        """
+        for pool in self.pools:
+            pool.close()
+        self.versions.close()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
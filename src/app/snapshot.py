@@ -0,0 +1,215 @@
+from typing import NamedTuple
+from typing import Optional
+from typing import Callable
+from typing import TypeVar
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from db import DatabaseVersion
+from db import Version
+import threading
+import logging
+import sqlite3
+import sys
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# Snapshot settings, overridable through the environment (0 bytes disables the snapshot)
+DEFAULT_MAX_BYTES = int(os.environ.get('SALES_SNAPSHOT_MAX_BYTES', str(256 * 1024 * 1024)))
+DEFAULT_CHECK_INTERVAL = float(os.environ.get('SALES_SNAPSHOT_CHECK_INTERVAL', '1.0'))
+
+ACCOUNT_COLUMNS = ('id', 'name', 'industry', 'region', 'status')
+
+T = TypeVar('T')
+
+
+class AccountData(NamedTuple):
+    """
+    An immutable, fully loaded copy of the accounts table.
+    """
+    version: Version
+    accounts: List[Dict[str, Any]]
+    by_id: Dict[str, Dict[str, Any]]
+    nbytes: int
+
+
+def estimate_bytes(value: Any, data: AccountData) -> int:
+    """
+    Approximates the memory held by an index built from `data`, not counting what it shares with it.
+
+    Follows dicts, lists, tuples, sets and object attributes down to their leaves. The
+    account records and their `id` strings are already counted in `data.nbytes`, so they
+    are skipped.
+    """
+    by_id = data.by_id
+    seen = {id(data.accounts), id(by_id)}
+    total = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        kind = type(obj)
+        if kind is str:
+            account = by_id.get(obj)
+            if account is None or account['id'] is not obj:
+                total += sys.getsizeof(obj)
+            continue
+        if kind in (int, float, bytes, bool) or obj is None:
+            total += sys.getsizeof(obj)
+            continue
+        if kind is dict and type(obj.get('id')) is str and by_id.get(obj['id']) is obj:
+            continue
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(vars(obj))
+        total += sys.getsizeof(obj)
+    return total
+
+
+class AccountSnapshot:
+    """
+    An optional in-process copy of the `accounts` table keyed by `id`.
+
+    The table is effectively read-only once `db_setup.py` has built it, so ID lookups
+    and the full listing can be answered from memory without touching SQLite. The
+    database version (see `DatabaseVersion`) is polled at most once per
+    `check_interval` seconds; when it changes the table is reloaded by the
+    request that noticed it and swapped in atomically. If the table does
+    not fit in `max_bytes`, `current()` returns None and callers fall back to SQL.
+    Indexes built from the snapshot with `derived` count against the same budget.
+    """
+
+    def __init__(self, database_path: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 versions: Optional[DatabaseVersion] = None) -> None:
+        """
+        Args:
+            database_path (str): Path to the SQLite database file.
+            max_bytes (int): Approximate memory budget for the snapshot; 0 disables it.
+            check_interval (float): Minimum seconds between staleness checks.
+            versions (Optional[DatabaseVersion]): Version tracker to share with other caches;
+                one is created if not given.
+        """
+        self.database_path = database_path
+        self.max_bytes = max_bytes
+        self.versions = versions or DatabaseVersion(database_path, check_interval)
+        self._data: Optional[AccountData] = None
+        self._loaded_version: Optional[Version] = None
+        self._reload_lock = threading.Lock()
+        # name -> (snapshot version, index or None if over budget, estimated bytes)
+        self._derived: Dict[str, Tuple[Version, Any, int]] = {}
+        self._derived_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f'file:{os.path.abspath(self.database_path)}?mode=ro'
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _load(self, version: Version) -> Optional[AccountData]:
+        """
+        Streams the accounts table into memory, giving up once the budget is exceeded.
+
+        Returns:
+            Optional[AccountData]: The loaded snapshot, or None if it is too large.
+        """
+        accounts: List[Dict[str, Any]] = []
+        by_id: Dict[str, Dict[str, Any]] = {}
+        used = sys.getsizeof(accounts) + sys.getsizeof(by_id)
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f'SELECT {", ".join(ACCOUNT_COLUMNS)} FROM accounts')
+            for row in cursor:
+                account = dict(zip(ACCOUNT_COLUMNS, row))
+                used += sys.getsizeof(account) + sum(sys.getsizeof(value) for value in row) + 16
+                if used > self.max_bytes:
+                    logger.warning(f'Accounts table exceeds the snapshot budget of {self.max_bytes} bytes; '
+                                   'serving from SQLite instead.')
+                    return None
+                accounts.append(account)
+                by_id[account['id']] = account
+        finally:
+            conn.close()
+        logger.info(f'Loaded snapshot of {len(accounts)} accounts (~{used // 1024} KiB).')
+        return AccountData(version, accounts, by_id, used)
+
+    def current(self) -> Optional[AccountData]:
+        """
+        Returns the up-to-date snapshot, reloading it first if the database changed.
+
+        Only one thread reloads at a time; while it does, other threads get None and
+        fall back to SQL, so a stale snapshot is never served.
+
+        Returns:
+            Optional[AccountData]: The snapshot, or None if callers should use SQL.
+        """
+        if not self.enabled:
+            return None
+        version = self.versions.current()
+        if version is None:
+            return None
+        if version == self._loaded_version:
+            return self._data
+        if not self._reload_lock.acquire(blocking=False):
+            return None
+        try:
+            if version != self._loaded_version:
+                # Drop the stale copy before loading so it is never served again
+                self._data = None
+                try:
+                    self._data = self._load(version)
+                except sqlite3.Error as e:
+                    logger.error(f'Error loading accounts snapshot: {e}')
+                self._loaded_version = version
+            return self._data
+        finally:
+            self._reload_lock.release()
+
+    def derived(self, name: str, build: Callable[[AccountData], T]) -> Optional[T]:
+        """
+        Returns an index built from the current snapshot, rebuilding it when the snapshot reloads.
+
+        The index's estimated size (see `estimate_bytes`) is added to the snapshot's. An index
+        that would take the total past `max_bytes` is dropped once built, and None is returned
+        for it until the next reload, so its callers fall back to SQL.
+
+        Args:
+            name (str): Cache key for the index.
+            build (Callable[[AccountData], T]): Builds the index from a snapshot.
+
+        Returns:
+            Optional[T]: The index, or None if no snapshot is available or the index is over budget.
+        """
+        data = self.current()
+        if data is None:
+            return None
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == data.version:
+            return cached[1]
+        with self._derived_lock:
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == data.version:
+                return cached[1]
+            value = build(data)
+            size = estimate_bytes(value, data) if value is not None else 0
+            used = data.nbytes + sum(cached[2] for key, cached in self._derived.items()
+                                     if key != name and cached[0] == data.version)
+            if used + size > self.max_bytes:
+                logger.warning(f"Index '{name}' (~{size // 1024} KiB) exceeds the snapshot budget of "
+                               f"{self.max_bytes} bytes; serving it from SQLite instead.")
+                value, size = None, 0
+            else:
+                logger.info(f"Built index '{name}' (~{size // 1024} KiB, snapshot total ~{(used + size) // 1024} KiB).")
+            self._derived[name] = (data.version, value, size)
+            return value
@@ -0,0 +1,82 @@
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Tuple
+import threading
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """
+    Records how long a cold start takes, phase by phase, and how long the first request takes.
+
+    Phases are marked in order with `mark`; each is timed from the previous mark, starting
+    at `started` (a `time.perf_counter()` reading taken before the app's imports).
+    """
+
+    def __init__(self, started: float) -> None:
+        """
+        Args:
+            started (float): `time.perf_counter()` reading at the start of the module import.
+        """
+        self.started = started
+        self._last = started
+        self.phases: List[Tuple[str, float]] = []
+        self.first_request: Optional[Dict[str, float]] = None
+        self._first_request_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> None:
+        """
+        Ends the current phase, naming it `phase`.
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    def request_started(self) -> None:
+        """
+        Notes the start of a request; only the first one is timed.
+        """
+        if self._first_request_started is None:
+            with self._lock:
+                if self._first_request_started is None:
+                    self._first_request_started = time.perf_counter()
+
+    def request_finished(self, path: str) -> None:
+        """
+        Notes the end of a request and logs the report once the first request has finished.
+        """
+        if self.first_request is not None or self._first_request_started is None:
+            return
+        with self._lock:
+            if self.first_request is not None:
+                return
+            now = time.perf_counter()
+            self.first_request = {
+                'latency_ms': round((now - self._first_request_started) * 1000, 3),
+                'since_start_ms': round((now - self.started) * 1000, 3),
+            }
+        logger.info(f'First request ({path}) took {self.first_request["latency_ms"]:.1f} ms, '
+                    f'{self.first_request["since_start_ms"]:.1f} ms after startup began.')
+
+    def as_dict(self) -> Dict:
+        """
+        Returns the report: each startup phase, the total, and the first request if one has finished.
+        """
+        return {
+            'phases_ms': {phase: round(ms, 3) for phase, ms in self.phases},
+            'startup_ms': round(sum(ms for _, ms in self.phases), 3),
+            'first_request': self.first_request,
+        }
+
+    def log(self) -> None:
+        """
+        Logs the startup phases at INFO.
+        """
+        phases = ', '.join(f'{phase} {ms:.1f} ms' for phase, ms in self.phases)
+        logger.info(f'Startup took {sum(ms for _, ms in self.phases):.1f} ms ({phases}).')
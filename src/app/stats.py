@@ -0,0 +1,68 @@
+from typing import Mapping
+from typing import Dict
+from typing import List
+from typing import Any
+from filters import FILTER_COLUMNS
+from db import ConnectionPool
+
+
+def parse_group_by(args: Mapping[str, str]) -> List[str]:
+    """
+    Reads the comma-separated `group_by` query parameter.
+
+    Args:
+        args (Mapping[str, str]): The request's query parameters.
+
+    Returns:
+        List[str]: The columns to group by, possibly none.
+
+    Raises:
+        ValueError: If a column is not one of FILTER_COLUMNS.
+    """
+    columns = [column.strip() for column in args.get('group_by', '').split(',') if column.strip()]
+    unknown = [column for column in columns if column not in FILTER_COLUMNS]
+    if unknown:
+        raise ValueError(f"group_by must be a subset of {', '.join(FILTER_COLUMNS)}")
+    return list(dict.fromkeys(columns))
+
+
+def has_summary_table(pool: ConnectionPool) -> bool:
+    """
+    Checks whether the database has the 'account_counts' summary table built by db_setup.py, once per database version.
+    """
+    return pool.per_version('has_summary_table', lambda: pool.fetch_one(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'account_counts'") is not None)
+
+
+def account_stats(pool: ConnectionPool, group_by: List[str], filters: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Counts the accounts matching `filters`, grouped by `group_by`.
+
+    Answered from the 'account_counts' summary table, which has one row per
+    (industry, region, status) combination, so the cost does not depend on the
+    number of accounts. Falls back to a GROUP BY over 'accounts' for databases
+    built before the summary table existed.
+
+    Args:
+        pool (ConnectionPool): Pool to run the query on.
+        group_by (List[str]): Columns to group by; empty for a single total.
+        filters (Mapping[str, str]): Column to value (case-insensitive), for columns in FILTER_COLUMNS.
+
+    Returns:
+        Dict[str, Any]: The overall `total` and, per group, the group's values and `count`.
+    """
+    if has_summary_table(pool):
+        table, count = 'account_counts', 'SUM(count)'
+    else:
+        table, count = 'accounts', 'COUNT(*)'
+    where = ' AND '.join(f'{column} = ? COLLATE NOCASE' for column in filters) or '1'
+    select = ', '.join([*group_by, f'{count} AS count'])
+    sql = f'SELECT {select} FROM {table} WHERE {where}'
+    if group_by:
+        sql += f' GROUP BY {", ".join(group_by)} ORDER BY count DESC, {", ".join(group_by)}'
+    rows = pool.fetch_all(sql, tuple(filters.values()))
+    groups = [dict(row) for row in rows if row['count']]
+    return {
+        'total': sum(group['count'] for group in groups),
+        'groups': groups if group_by else [],
+    }
@@ -1,8 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Callable
+from typing import Iterable
 from typing import Optional
+from typing import TypeVar
+from typing import Union
+from typing import Tuple
 from typing import Dict
-from typing import List 
+from typing import List
+from typing import Any
 import requests
 import logging
+import random
+import time
 
 
 # Configure logging
@@ -11,6 +21,264 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Static variables
 BASE_URL = 'http://127.0.0.1:5000'
 
+# Client defaults: requests in flight per client, (connect, read) timeout in seconds, retry policy
+DEFAULT_CONCURRENCY = 16
+DEFAULT_TIMEOUT = (3.05, 10.0)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.2
+MAX_BACKOFF = 5.0
+
+# Transient statuses worth retrying; every API call is read-only, so POSTs are safe to repeat
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# IDs per call to the batch endpoint (the server's SALES_BATCH_MAX_IDS default)
+BATCH_SIZE = 500
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class SalesClient:
+    """
+    Client for the Sales API that reuses connections and runs bulk calls concurrently.
+
+    All calls share one keep-alive `requests.Session` whose connection pool is sized to
+    `concurrency`, so connections (and, against the deployed function, TLS sessions) are
+    set up once. Connection errors, timeouts and transient statuses are retried with
+    capped, fully jittered exponential backoff, honouring `Retry-After` on 429/503.
+    Like the module-level helpers, methods log failures and return None.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF) -> None:
+        """
+        Args:
+            base_url (str): Root URL of the API.
+            concurrency (int): Most requests in flight at once, and the size of the connection pool.
+            timeout (Union[float, Tuple[float, float]]): Per-call timeout, or (connect, read) timeouts.
+            retries (int): Retries after the first attempt.
+            backoff (float): Base delay in seconds; attempt n waits up to backoff * 2**n.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> 'SalesClient':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the worker threads and closes the pooled connections.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
+
+    def _delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt`.
+        """
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return min(float(response.headers['Retry-After']), MAX_BACKOFF)
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+    def request(self, method: str, path: str, **kwargs: Any) -> requests.Response:
+        """
+        Sends a request, retrying transient failures.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Path under the base URL, e.g. '/api/accounts'.
+            **kwargs: Passed on to `requests.Session.request`.
+
+        Returns:
+            requests.Response: The final response; statuses other than 2xx are raised.
+
+        Raises:
+            requests.exceptions.RequestException: If the last attempt failed.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        url = f'{self.base_url}{path}'
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                time.sleep(self._delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response
+
+    def _map(self, func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Applies `func` to every item on the client's thread pool, at most `concurrency` at a time.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='sales-client')
+        return list(self._executor.map(func, items))
+
+    def get_all_accounts(self) -> Optional[List[Dict]]:
+        """
+        Fetch all accounts. Returns the list of accounts, or None on error.
+        """
+        try:
+            return self.request('GET', '/api/accounts').json()
+        except requests.exceptions.RequestException as e:
+            logging.error("Error retrieving accounts: %s", e)
+            return None
+
+    def get_account(self, account_id: str) -> Optional[Dict]:
+        """
+        Fetch a single account by its ID. Returns the account, or None if missing or on error.
+        """
+        try:
+            return self.request('GET', f'/api/accounts/{account_id}').json()
+        except requests.exceptions.RequestException as e:
+            logging.error("Failed to fetch account %s: %s", account_id, e)
+            return None
+
+    def search_accounts(self, name: str, **params: Any) -> Optional[List[Dict]]:
+        """
+        Search for accounts by name; extra keyword arguments (`limit`, `offset`, `mode`) become
+        query parameters. Returns the matching accounts, or None on error.
+        """
+        try:
+            return self.request('GET', '/api/accounts/search', params={'name': name, **params}).json()
+        except requests.exceptions.RequestException as e:
+            logging.error("Failed to search accounts by name %s: %s", name, e)
+            return None
+
+    def generate_account_url(self, account_id: str, account_type: str) -> Optional[Dict]:
+        """
+        Generate a URL for the given account ID and type. Returns {'url': ...}, or None on error.
+        """
+        try:
+            payload = {'account_id': account_id, 'account_type': account_type}
+            return self.request('POST', '/api/accounts/url', json=payload).json()
+        except requests.exceptions.RequestException as e:
+            logging.error("Failed to generate URL for account %s of type %s: %s", account_id, account_type, e)
+            return None
+
+    def get_accounts_batch(self, ids: List[str]) -> Optional[Dict[str, List]]:
+        """
+        Resolve up to BATCH_SIZE IDs in one call. Returns the found `accounts` and `missing` IDs, or None on error.
+        """
+        try:
+            return self.request('POST', '/api/accounts/batch', json={'ids': ids}).json()
+        except requests.exceptions.RequestException as e:
+            logging.error("Failed to fetch a batch of %d accounts: %s", len(ids), e)
+            return None
+
+    def get_account_context(self, query: str, **params: Any) -> Optional[Dict]:
+        """
+        Resolve an account ID or name to the account record(s) plus their URLs. Extra keyword
+        arguments (`limit`) become query parameters. Returns the context, or None if nothing matches or on error.
+        """
+        try:
+            return self.request('GET', '/api/accounts/context', params={'query': query, **params}).json()
+        except requests.exceptions.RequestException as e:
+            logging.error("Failed to resolve account context for %s: %s", query, e)
+            return None
+
+    def get_account_contexts(self, queries: List[str], **params: Any) -> Optional[List[Dict]]:
+        """
+        Resolve several account IDs or names in one call. Returns one context per distinct query, or None on error.
+        """
+        try:
+            return self.request('POST', '/api/accounts/context/batch', params=params, json={'queries': queries}).json()['results']
+        except requests.exceptions.RequestException as e:
+            logging.error("Failed to resolve account context for %d queries: %s", len(queries), e)
+            return None
+
+    def export_accounts(self, columns: Optional[List[str]] = None, **filters: str) -> Optional[Dict[str, List]]:
+        """
+        Export accounts through the columnar JSON endpoint, optionally projected to `columns` and
+        filtered by `industry`, `region` and `status`. Returns the decoded values per column, or None on error.
+        """
+        params = {**filters, 'format': 'json'}
+        if columns:
+            params['columns'] = ','.join(columns)
+        try:
+            export = self.request('GET', '/api/accounts/export', params=params).json()
+        except requests.exceptions.RequestException as e:
+            logging.error("Failed to export accounts: %s", e)
+            return None
+        dictionaries: Dict[str, List] = {column: [] for column in export['dictionary_columns']}
+        data: Dict[str, List] = {column: [] for column in export['columns']}
+        for batch in export['batches']:
+            for column, values in batch['dictionaries'].items():
+                dictionaries[column].extend(values)
+            for column in export['columns']:
+                if column in dictionaries:
+                    values = dictionaries[column]
+                    data[column].extend(values[code] for code in batch[column])
+                else:
+                    data[column].extend(batch[column])
+        return data
+
+    def get_accounts(self, ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Fetch many accounts by ID.
+
+        The IDs go to the batch endpoint in chunks of BATCH_SIZE, and the chunks are sent
+        concurrently.
+
+        Args:
+            ids (Iterable[str]): Account IDs; duplicates are fetched once.
+
+        Returns:
+            Dict[str, Optional[Dict]]: Each ID mapped to its account, or None if it does not
+                exist or its chunk failed.
+        """
+        ids = list(dict.fromkeys(ids))
+        chunks = [ids[start:start + BATCH_SIZE] for start in range(0, len(ids), BATCH_SIZE)]
+        found: Dict[str, Optional[Dict]] = dict.fromkeys(ids)
+        for result in self._map(self.get_accounts_batch, chunks):
+            for account in (result or {}).get('accounts', []):
+                found[account['id']] = account
+        return found
+
+    def search_many(self, names: Iterable[str], **params: Any) -> Dict[str, Optional[List[Dict]]]:
+        """
+        Run many name searches concurrently.
+
+        Args:
+            names (Iterable[str]): Search strings; duplicates are searched once.
+            **params: Query parameters applied to every search, e.g. `mode='fuzzy'`.
+
+        Returns:
+            Dict[str, Optional[List[Dict]]]: Each name mapped to its results, or None on error.
+        """
+        names = list(dict.fromkeys(names))
+        results = self._map(lambda name: self.search_accounts(name, **params), names)
+        return dict(zip(names, results))
+
+    def generate_account_urls(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """
+        Generate many account URLs concurrently from (account_id, account_type) pairs, in order.
+        """
+        return self._map(lambda pair: self.generate_account_url(*pair), pairs)
+
+
+# Shared client behind the module-level helpers, so they reuse connections too
+client = SalesClient()
+
 
 def get_all_accounts() -> Optional[List[Dict]]:
     """
@@ -18,15 +286,10 @@ def get_all_accounts() -> Optional[List[Dict]]:
 
     Returns a list of accounts if successful, None otherwise.
     """
-    try:
-        response = requests.get(f'{BASE_URL}/api/accounts')
-        response.raise_for_status()  # Will raise an exception for HTTP errors
-        accounts = response.json()
+    accounts = client.get_all_accounts()
+    if accounts is not None:
         logging.info("All Accounts: %s", accounts)
-        return accounts
-    except requests.exceptions.RequestException as e:
-        logging.error("Error retrieving accounts: %s", e)
-        return None
+    return accounts
 
 
 def get_account_by_id(account_id: str) -> Optional[Dict]:
@@ -35,15 +298,10 @@ def get_account_by_id(account_id: str) -> Optional[Dict]:
 
     Returns the account if successful, None otherwise.
     """
-    try:
-        response = requests.get(f'{BASE_URL}/api/accounts/{account_id}')
-        response.raise_for_status()
-        account = response.json()
+    account = client.get_account(account_id)
+    if account is not None:
         logging.info("Account %s: %s", account_id, account)
-        return account
-    except requests.exceptions.RequestException as e:
-        logging.error("Failed to fetch account %s: %s", account_id, e)
-        return None
+    return account
 
 
 def search_accounts_by_name(name: str) -> Optional[List[Dict]]:
@@ -52,16 +310,11 @@ def search_accounts_by_name(name: str) -> Optional[List[Dict]]:
 
     Returns a list of matching accounts if successful, None otherwise.
     """
-    try:
-        response = requests.get(f'{BASE_URL}/api/accounts/search', params={'name': name})
-        response.raise_for_status()
-        results = response.json()
+    results = client.search_accounts(name)
+    if results is not None:
         logging.info("Search Results for %s: %s", name, results)
-        return results
-    except requests.exceptions.RequestException as e:
-        logging.error("Failed to search accounts by name %s: %s", name, e)
-        return None
-    
+    return results
+
 
 def generate_account_url(account_id: str, account_type: str) -> Optional[Dict]:
     """
@@ -69,20 +322,23 @@ def generate_account_url(account_id: str, account_type: str) -> Optional[Dict]:
 
     Returns the generated URL if successful, None otherwise.
     """
-    try:
-        payload = {'account_id': account_id, 'account_type': account_type}
-        response = requests.post(f'{BASE_URL}/api/accounts/url', json=payload)
-        response.raise_for_status()
-        url = response.json()
+    url = client.generate_account_url(account_id, account_type)
+    if url is not None:
         logging.info("Generated URL for account %s of type %s: %s", account_id, account_type, url)
-        return url
-    except requests.exceptions.RequestException as e:
-        logging.error("Failed to generate URL for account %s of type %s: %s", account_id, account_type, e)
-        return None
+    return url
 
 
 if __name__ == '__main__':
     get_all_accounts()
-    get_account_by_id('E0B3G6')  
+    get_account_by_id('E0B3G6')
     search_accounts_by_name('Bob')
-    generate_account_url('E0B3G6', 'sales')
\ No newline at end of file
+    generate_account_url('E0B3G6', 'sales')
+    contexts = client.get_account_contexts(['E0B3G6', 'Kilo'])
+    logging.info("Account Contexts: %s", contexts)
+    export = client.export_accounts(['id', 'region'], status='Active')
+    logging.info("Exported %d active accounts", len(export['id']) if export else 0)
+    accounts = client.get_accounts(['E0B3G6', 'J7L9Q8', 'MISSING'])
+    logging.info("Accounts by ID: %s", accounts)
+    results = client.search_many(['Kilo', 'Bob', 'Alpha'])
+    logging.info("Search Results: %s", {name: len(found or []) for name, found in results.items()})
+    client.close()
@@ -1,6 +1,7 @@
 from flask import jsonify
 from flask import request 
 from typing import Tuple
+from flask import Response
 from flask import Flask
 from typing import List
 from typing import Dict 
@@ -8,10 +9,58 @@ import logging
 import sqlite3
 import flask 
 import sys
+import os
+
+# Share the data-access layer with the Cloud Function in src/app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from search import search_accounts_by_name
+from snapshot import AccountSnapshot
+from snapshot import DEFAULT_MAX_BYTES as SNAPSHOT_MAX_BYTES
+from shards import ShardedAccounts
+from search import parse_page_args
+from pagination import parse_keyset_args
+from pagination import NDJSON_MIMETYPE
+from pagination import stream_accounts
+from pagination import next_page_link
+from pagination import MAX_PAGE_LIMIT
+from pagination import page_accounts
+from pagination import wants_ndjson
+from fuzzy import search_accounts_fuzzy
+from fuzzy import DEFAULT_FUZZY_LIMIT
+from fuzzy import MAX_FUZZY_LIMIT
+from filters import filter_accounts
+from filters import parse_filters
+from export import COLUMNAR_JSON_MIMETYPE
+from export import negotiate_format
+from export import export_accounts
+from export import ARROW_MIMETYPE
+from export import parse_columns
+from stats import parse_group_by
+from stats import account_stats
+from batch import get_accounts_by_ids
+from batch import parse_batch_ids
+from context import parse_context_queries
+from context import ACCOUNT_URL_BASES
+from context import DEFAULT_CONTEXT_MATCHES
+from context import MAX_CONTEXT_MATCHES
+from context import account_contexts
+from serialize import json_response
+from serialize import dumps_rows
+from serialize import Payload
+from serialize import dumps
+from http_cache import ConditionalCache
+from result_cache import ResultCache
+from result_cache import cache_key
+from metrics import init_app as init_metrics
+from metrics import observe_sql
+from db import ConnectionPool
 
 
 app = Flask(__name__)
 
+# Request counters and latency histograms at /metrics; registered first so every request is timed
+init_metrics(app)
+
 # Static variable for database path
 DATABASE_PATH = './data/sales.db'
 
@@ -23,6 +72,29 @@ logging.basicConfig(level=logging.INFO,
 
 logger.info(f'Using Flask=={flask.__version__}')
 
+# Shared pool of read-only connections, reused across requests
+pool = ConnectionPool(DATABASE_PATH, observer=observe_sql)
+
+# Optional sharded storage written by `db_setup.py --shards`; every account route (list, lookup,
+# substring and fuzzy search, filter, export, stats, batch and context) then queries the shards
+# instead of DATABASE_PATH
+SHARD_MANIFEST = os.environ.get('SALES_SHARD_MANIFEST', '')
+shards = ShardedAccounts(SHARD_MANIFEST, observer=observe_sql) if SHARD_MANIFEST else None
+
+# Version of the database file(s), shared by the snapshot and the HTTP cache headers
+versions = shards.versions if shards is not None else pool.versions
+
+# Optional in-memory copy of the accounts table; None from current() means use SQL (always, when sharded)
+snapshot = AccountSnapshot(DATABASE_PATH, max_bytes=0 if shards is not None else SNAPSHOT_MAX_BYTES,
+                           versions=versions)
+
+# Search results, shared by identical concurrent requests and dropped when the database changes
+search_results = ResultCache(versions, 'search')
+
+# ETag, Cache-Control and 304 Not Modified for the read-only routes
+ConditionalCache(versions, ['get_accounts', 'get_account', 'search_accounts', 'filter_accounts_route',
+                            'account_stats_route', 'account_context_route', 'export_accounts_route']).init_app(app)
+
 
 @app.route('/')
 def home() -> str:
@@ -36,16 +108,38 @@ def home() -> str:
 @app.route('/api/accounts', methods=['GET'])
 def get_accounts() -> Tuple[List[Dict], int]:
     """ Retrieve all accounts from the database.
+    Pages by `id` with `limit` and `after`, or streams NDJSON for `Accept: application/x-ndjson`.
     Returns:
         A JSON list of accounts and a HTTP status code.
     """
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute('SELECT id, name, industry, region, status FROM accounts')
-            accounts = c.fetchall()
-            return jsonify([dict(account) for account in accounts]), 200
+        after, limit = parse_keyset_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if wants_ndjson(request.accept_mimetypes):
+            if shards is not None:
+                return Response(shards.stream(after, limit), mimetype=NDJSON_MIMETYPE), 200
+            return Response(stream_accounts(snapshot, pool, after, limit), mimetype=NDJSON_MIMETYPE), 200
+        if after is not None or limit is not None:
+            limit = limit or MAX_PAGE_LIMIT
+            if shards is not None:
+                page = shards.page(after, limit)
+            else:
+                page = page_accounts(snapshot, pool, after, limit)
+            response = json_response(dumps(page))
+            link = next_page_link(request.path, page, limit)
+            if link:
+                response.headers['Link'] = link
+            return response, 200
+        if shards is not None:
+            return json_response(dumps(shards.page(None, None))), 200
+        # The full list is serialized and compressed once per snapshot, not per request
+        payload = snapshot.derived('accounts_json', lambda data: Payload(dumps(data.accounts)))
+        if payload is not None:
+            return json_response(payload), 200
+        accounts = pool.fetch_all('SELECT id, name, industry, region, status FROM accounts')
+        return json_response(dumps_rows(accounts)), 200
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
         return jsonify({'error': 'Unable to fetch accounts'}), 500
@@ -60,15 +154,17 @@ def get_account(account_id: str) -> Tuple[Dict, int]:
         A JSON object of the account and a HTTP status code.
     """
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute('SELECT * FROM accounts WHERE id = ?', (account_id,))
-            account = c.fetchone()
-            if account:
-                return jsonify(dict(account)), 200
-            else:
-                return jsonify({'error': 'Account not found'}), 404
+        data = snapshot.current()
+        if data is not None:
+            account = data.by_id.get(account_id)
+        elif shards is not None:
+            account = shards.get_account(account_id)
+        else:
+            account = pool.fetch_one('SELECT * FROM accounts WHERE id = ?', (account_id,))
+        if account:
+            return jsonify(dict(account)), 200
+        else:
+            return jsonify({'error': 'Account not found'}), 404
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
         return jsonify({'error': 'Unable to fetch account'}), 500
@@ -76,23 +172,173 @@ def get_account(account_id: str) -> Tuple[Dict, int]:
 
 @app.route('/api/accounts/search', methods=['GET'])
 def search_accounts() -> Tuple[List[Dict], int]:
-    """ Search for accounts by name.
+    """ Search for accounts by name, paged with `limit` and `offset`.
+    With `mode=fuzzy`, returns the `limit` closest names with a similarity `score`.
     Returns:
         A JSON list of accounts and a HTTP status code.
     """
     search_query = request.args.get('name', '')
+    mode = request.args.get('mode', 'substring')
+    if mode not in ('substring', 'fuzzy'):
+        return jsonify({'error': 'mode must be substring or fuzzy'}), 400
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute("SELECT * FROM accounts WHERE name LIKE '%' || ? || '%'", (search_query,))
-            accounts = c.fetchall()
-            return jsonify([dict(account) for account in accounts]), 200
+        if mode == 'fuzzy':
+            limit, offset = parse_page_args(request.args, DEFAULT_FUZZY_LIMIT, MAX_FUZZY_LIMIT)
+        else:
+            limit, offset = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    key = cache_key('search_accounts', name=search_query, mode=mode, limit=limit, offset=offset)
+    try:
+        if mode == 'fuzzy' and shards is not None:
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps(shards.fuzzy(search_query, limit))))
+        elif mode == 'fuzzy':
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps(search_accounts_fuzzy(snapshot, pool, search_query, limit))))
+        elif shards is not None:
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps(shards.search(search_query, limit, offset))))
+        else:
+            payload = search_results.get_or_compute(
+                key, lambda: Payload(dumps_rows(search_accounts_by_name(pool, search_query, limit, offset))))
+        return json_response(payload), 200
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
         return jsonify({'error': 'Unable to search accounts'}), 500
     
 
+@app.route('/api/accounts/filter', methods=['GET'])
+def filter_accounts_route() -> Tuple[List[Dict], int]:
+    """ Filter accounts by `industry`, `region` and/or `status`, paged with `limit` and `offset`.
+    Returns:
+        A JSON list of accounts and a HTTP status code.
+    """
+    filters = parse_filters(request.args)
+    try:
+        limit, offset = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if shards is not None:
+            return json_response(dumps(shards.filter(filters, limit, offset))), 200
+        return json_response(dumps(filter_accounts(snapshot, pool, filters, limit, offset))), 200
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({'error': 'Unable to filter accounts'}), 500
+    
+
+@app.route('/api/accounts/export', methods=['GET'])
+def export_accounts_route() -> Tuple[Response, int]:
+    """ Stream accounts as column-oriented JSON, or Arrow IPC with `format=arrow` when pyarrow is installed.
+    Takes `columns` (comma-separated) and the `industry`, `region` and `status` filters.
+    Returns:
+        The streamed export and a HTTP status code.
+    """
+    try:
+        columns = parse_columns(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        fmt = negotiate_format(request.args, request.accept_mimetypes)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 406
+    filters = parse_filters(request.args)
+    try:
+        chunks = export_accounts(snapshot, shards.pools if shards is not None else [pool], columns, filters, fmt)
+        return Response(chunks, mimetype=ARROW_MIMETYPE if fmt == 'arrow' else COLUMNAR_JSON_MIMETYPE), 200
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({'error': 'Unable to export accounts'}), 500
+
+
+@app.route('/api/accounts/stats', methods=['GET'])
+def account_stats_route() -> Tuple[Dict, int]:
+    """ Count accounts filtered by `industry`, `region` and/or `status`, grouped by `group_by`.
+    Returns:
+        A JSON object with the total and per-group counts and a HTTP status code.
+    """
+    filters = parse_filters(request.args)
+    try:
+        group_by = parse_group_by(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if shards is not None:
+            return jsonify(shards.stats(group_by, filters)), 200
+        return jsonify(account_stats(pool, group_by, filters)), 200
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({'error': 'Unable to compute account stats'}), 500
+    
+
+@app.route('/api/accounts/batch', methods=['POST'])
+def get_accounts_batch() -> Tuple[Dict, int]:
+    """ Retrieve many accounts by ID, given a JSON body {"ids": [...]}.
+    Returns:
+        A JSON object with the found `accounts` and `missing` IDs and a HTTP status code.
+    """
+    if request.content_type != 'application/json':
+        return jsonify({'error': 'Content-Type must be application/json'}), 415
+    try:
+        ids = parse_batch_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+    try:
+        if shards is not None:
+            return jsonify(shards.get_many(ids)), 200
+        return jsonify(get_accounts_by_ids(snapshot, pool, ids)), 200
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({'error': 'Unable to fetch accounts'}), 500
+    
+
+@app.route('/api/accounts/context', methods=['GET'])
+def account_context_route() -> Tuple[Dict, int]:
+    """ Resolve an account ID or name (`query`) to the account record plus its portfolio,
+    sales and activity URLs; names return up to `limit` matches, exact names first.
+    Returns:
+        A JSON object with the query, how it matched and the accounts, and a HTTP status code.
+    """
+    query = request.args.get('query', '').strip()
+    if not query:
+        return jsonify({'error': 'query is required'}), 400
+    try:
+        limit, _ = parse_page_args(request.args, DEFAULT_CONTEXT_MATCHES, MAX_CONTEXT_MATCHES)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        context = account_contexts(snapshot, pool, [query], limit, shards)[0]
+        if not context['accounts']:
+            return jsonify({'error': 'Account not found'}), 404
+        return json_response(dumps(context)), 200
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({'error': 'Unable to resolve account'}), 500
+
+
+@app.route('/api/accounts/context/batch', methods=['POST'])
+def account_context_batch() -> Tuple[Dict, int]:
+    """ Resolve several account IDs or names from a JSON body {"queries": [...]}.
+    Returns:
+        A JSON object with one context per query in `results`, and a HTTP status code.
+    """
+    try:
+        queries = parse_context_queries(request.get_json(force=True, silent=True))
+        limit, _ = parse_page_args(request.args, DEFAULT_CONTEXT_MATCHES, MAX_CONTEXT_MATCHES)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+    try:
+        return json_response(dumps({'results': account_contexts(snapshot, pool, queries, limit, shards)})), 200
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({'error': 'Unable to resolve accounts'}), 500
+
+
 @app.route('/api/accounts/url', methods=['POST'])
 def generate_account_url() -> Tuple[Dict, int]:
     """ 
@@ -102,9 +348,6 @@ def generate_account_url() -> Tuple[Dict, int]:
         A JSON object with the generated URL and a HTTP status code.
     """
     try:
-        # Log the incoming request for debugging purposes
-        app.logger.info('Received request: %s', request.data)
-
         # Ensure the content type is JSON
         if request.content_type != 'application/json':
             return jsonify({'error': 'Content-Type must be application/json'}), 415
@@ -112,9 +355,6 @@ def generate_account_url() -> Tuple[Dict, int]:
         # Parse JSON data from the request
         data = request.get_json()
 
-        # Log parsed data for debugging purposes
-        app.logger.info('Parsed JSON data: %s', data)
-
         # Extract account_id and account_type
         account_id = data.get('account_id')
         account_type = data.get('account_type')
@@ -123,15 +363,8 @@ def generate_account_url() -> Tuple[Dict, int]:
         if not account_id or not account_type:
             return jsonify({'error': 'account_id and account_type are required'}), 400
 
-        # Define base URL parts
-        base_urls = {
-            'portfolio': 'https://sales.com/portfolio/accounts/',
-            'sales': 'https://sales.com/sales/accounts/',
-            'activity': 'https://sales.com/activity/accounts/'
-        }
-
         # Get the appropriate base URL
-        base_url = base_urls.get(account_type.lower())
+        base_url = ACCOUNT_URL_BASES.get(account_type.lower())
         if not base_url:
             return jsonify({'error': 'Invalid account_type'}), 400
 
@@ -139,7 +372,7 @@ def generate_account_url() -> Tuple[Dict, int]:
         full_url = f"{base_url}{account_id}"
 
         # Log generated URL for debugging purposes
-        app.logger.info('Generated URL: %s', full_url)
+        app.logger.debug('Generated URL: %s', full_url)
 
         return jsonify({'url': full_url}), 200
 
@@ -0,0 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+import argparse
+import asyncio
+import json
+import sys
+import io
+import os
+
+
+# Serve the Cloud Function's app; it resolves sales.db relative to its own directory
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+os.chdir(APP_DIR)
+sys.path.append(APP_DIR)
+import main
+
+# Async serving settings, overridable through the environment
+MAX_WORKERS = int(os.environ.get('SALES_ASGI_WORKERS', str(main.pool.size)))
+MAX_PENDING = int(os.environ.get('SALES_ASGI_MAX_PENDING', '256'))
+
+# Bytes of a response body gathered per trip to the executor
+BODY_CHUNK_SIZE = 64 * 1024
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class AsgiAdapter:
+    """
+    Serves a WSGI app over ASGI, running the blocking work on a bounded thread pool.
+
+    The event loop only parses requests and writes responses, so it can hold hundreds
+    of concurrent requests while at most `max_workers` of them run route code and SQLite
+    queries. Sizing the executor to the connection pool means a worker never waits for
+    a connection. Requests beyond `max_pending` in flight are turned away with a 503
+    and `Retry-After` instead of queueing without bound.
+    """
+
+    def __init__(self, wsgi_app: Callable, max_workers: int = MAX_WORKERS,
+                 max_pending: int = MAX_PENDING, on_shutdown: Optional[Callable[[], None]] = None) -> None:
+        """
+        Args:
+            wsgi_app (Callable): The WSGI application to serve.
+            max_workers (int): Threads running requests at once.
+            max_pending (int): Requests admitted at once, running or waiting for a thread.
+            on_shutdown (Optional[Callable[[], None]]): Called once the server shuts down.
+        """
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self.on_shutdown = on_shutdown
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sales-db')
+        self.pending = 0
+        self.rejected = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                if self.on_shutdown is not None:
+                    self.on_shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Only the event loop thread touches `pending`, so no lock is needed
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            await self._send_busy(send)
+            return
+        self.pending += 1
+        try:
+            body = await self._read_body(receive)
+            loop = asyncio.get_running_loop()
+            environ = self._environ(scope, body)
+            status, headers, response = await loop.run_in_executor(self.executor, self._start, environ)
+            try:
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                done = False
+                while not done:
+                    data, done = await loop.run_in_executor(self.executor, response.read)
+                    await send({'type': 'http.response.body', 'body': data, 'more_body': not done})
+            finally:
+                await loop.run_in_executor(self.executor, response.close)
+        finally:
+            self.pending -= 1
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        parts = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            parts.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(parts)
+
+    @staticmethod
+    async def _send_busy(send: Send) -> None:
+        body = json.dumps({'error': 'Server busy, retry later'}).encode()
+        await send({'type': 'http.response.start', 'status': 503, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'retry-after', b'1'),
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def _environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+        """
+        Builds the PEP 3333 environ for an ASGI HTTP scope.
+        """
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            key = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if key == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif key != 'CONTENT_LENGTH':
+                key = f'HTTP_{key}'
+                environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    def _start(self, environ: Dict[str, Any]) -> Tuple[int, List[Tuple[bytes, bytes]], '_Body']:
+        """
+        Runs the WSGI app up to its response headers (on a worker thread).
+        """
+        response: List[Any] = []
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> Callable:
+            response[:] = [int(status.split(' ', 1)[0]),
+                           [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+            return lambda data: None
+
+        body = _Body(self.wsgi_app(environ, start_response))
+        if not response:
+            # The app may defer start_response until its first chunk is produced
+            body.prime()
+        return response[0], response[1], body
+
+
+class _Body:
+    """
+    A WSGI response body, read in blocks from a worker thread.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = chunks
+        self.iterator = iter(chunks)
+        self.buffer: List[bytes] = []
+
+    def prime(self) -> None:
+        """
+        Pulls the first chunk into the buffer.
+        """
+        first = next(self.iterator, None)
+        if first is not None:
+            self.buffer.append(first)
+
+    def read(self, size: int = BODY_CHUNK_SIZE) -> Tuple[bytes, bool]:
+        """
+        Pulls chunks until `size` bytes or the end of the body.
+
+        Plain responses are a single chunk and go out in one trip; streamed responses
+        are pulled a block at a time, so they are never buffered whole.
+
+        Returns:
+            Tuple[bytes, bool]: The data and whether the body is exhausted.
+        """
+        parts, self.buffer = self.buffer, []
+        total = sum(len(part) for part in parts)
+        for data in self.iterator:
+            parts.append(data)
+            total += len(data)
+            if total >= size:
+                return b''.join(parts), False
+        return b''.join(parts), True
+
+    def close(self) -> None:
+        close = getattr(self.chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+app = AsgiAdapter(main.app, on_shutdown=main.pool.close)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the Sales API over ASGI (requires uvicorn).')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=5000, help='Port to bind (default: %(default)s)')
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('The async server needs uvicorn: pip install uvicorn')
+    uvicorn.run(app, host=args.host, port=args.port, lifespan='on')
@@ -0,0 +1,89 @@
+from typing import Dict
+from typing import List
+from typing import Any
+import argparse
+import random
+import string
+import time
+import csv
+import sys
+import os
+
+from generate_sales import generate_block
+
+# Share the fuzzy index with the Cloud Function in src/app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+import fuzzy
+
+
+def load_accounts(path: str, rows: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Reads the accounts from a sales CSV, or generates `rows` of them like generate_sales.py.
+    """
+    if path:
+        with open(path, newline='') as file:
+            return [{'id': row[0], 'name': row[1]} for row in list(csv.reader(file))[1:]]
+    lines = generate_block(seed, 0, 0, rows).decode().splitlines()
+    return [{'id': row[0], 'name': row[1]} for row in csv.reader(lines)]
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """
+    Applies one to three random deletions, insertions or substitutions to a name.
+    """
+    for _ in range(rng.choice((1, 1, 2, 2, 3))):
+        i = rng.randrange(len(name))
+        char = rng.choice(string.ascii_lowercase)
+        edit = rng.choice('dis')
+        if edit == 'd':
+            name = name[:i] + name[i + 1:]
+        elif edit == 'i':
+            name = name[:i] + char + name[i:]
+        else:
+            name = name[:i] + char + name[i + 1:]
+    return name
+
+
+def best_score(names: List[str], query: str, min_score: float) -> float:
+    """
+    Returns the best similarity to `query` over every name, the answer the index should find.
+    """
+    found = fuzzy.rank(fuzzy.normalize(query), ((name, [{}]) for name in names), 1, min_score)
+    return found[0]['score'] if found else 0.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure fuzzy name search latency and recall.')
+    parser.add_argument('--csv', help='Sales CSV to index (default: generate --rows accounts)')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Accounts to generate (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the accounts and queries (default: %(default)s)')
+    parser.add_argument('--queries', type=int, default=200, help='Misspelled queries to time (default: %(default)s)')
+    parser.add_argument('--check', type=int, default=20,
+                        help='Queries also checked against a full scan (default: %(default)s)')
+    parser.add_argument('--limit', type=int, default=fuzzy.DEFAULT_FUZZY_LIMIT,
+                        help='Results per query (default: %(default)s)')
+    args = parser.parse_args()
+
+    accounts = load_accounts(args.csv, args.rows, args.seed)
+    start = time.perf_counter()
+    index = fuzzy.FuzzyNameIndex(accounts)
+    print(f'{len(accounts)} accounts, {len(index.names)} distinct names, '
+          f'index built in {time.perf_counter() - start:.1f} s')
+
+    rng = random.Random(args.seed)
+    queries = [misspell(rng.choice(index.names), rng) for _ in range(args.queries)]
+    timings = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, args.limit))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f'latency (ms): p50 {timings[len(timings) // 2]:.2f}, '
+          f'p95 {timings[int(len(timings) * 0.95)]:.2f}, max {timings[-1]:.2f}')
+
+    checked = queries[:args.check]
+    hits = sum(1 for query, found in zip(checked, results)
+               if (found[0]['score'] if found else 0.0) >= best_score(index.names, query, fuzzy.DEFAULT_MIN_SCORE))
+    if checked:
+        print(f'best match found for {hits} of {len(checked)} queries checked against a full scan')
@@ -0,0 +1,70 @@
+from typing import Callable
+from typing import List
+from flask import jsonify
+from flask import Flask
+import argparse
+import sqlite3
+import timeit
+import sys
+import os
+
+# Share the serialization layer with the Cloud Function in src/app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+import serialize
+
+
+app = Flask(__name__)
+
+
+def make_rows(count: int) -> List[sqlite3.Row]:
+    """
+    Builds `count` synthetic accounts in an in-memory database, returned as `sqlite3.Row`s.
+    """
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('CREATE TABLE accounts (id TEXT PRIMARY KEY, name TEXT, industry TEXT, region TEXT, status TEXT)')
+    conn.executemany('INSERT INTO accounts VALUES (?, ?, ?, ?, ?)',
+                     ((f'A{i:07d}', f'Account {i} Ltd', 'Technology', 'North America', 'Active')
+                      for i in range(count)))
+    return conn.execute('SELECT id, name, industry, region, status FROM accounts').fetchall()
+
+
+def time_call(func: Callable, number: int) -> float:
+    """
+    Returns the best mean milliseconds per call, draining the response body.
+    """
+    def invoke():
+        func().get_data()
+    invoke()
+    return min(timeit.repeat(invoke, number=number, repeat=5)) / number * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare jsonify with the pre-serialized JSON layer.')
+    parser.add_argument('--rows', type=int, default=10000, help='Accounts per response (default: %(default)s)')
+    parser.add_argument('--number', type=int, default=20, help='Calls per timing run (default: %(default)s)')
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    accounts = [dict(row) for row in rows]
+    payload = serialize.Payload(serialize.dumps(accounts))
+    encoders = {'orjson': serialize.orjson, 'stdlib': None} if serialize.orjson else {'stdlib': None}
+
+    print(f"{'case':<34}{'jsonify (ms)':>14}{'new (ms)':>12}{'speedup':>10}")
+    for accept_encoding in ('identity', 'gzip'):
+        with app.test_request_context(headers={'Accept-Encoding': accept_encoding}):
+            for name, module in encoders.items():
+                serialize.orjson = module
+                cases = {
+                    f'rows, {name}, {accept_encoding}': (
+                        lambda: jsonify([dict(row) for row in rows]),
+                        lambda: serialize.json_response(serialize.dumps_rows(rows))),
+                    f'cached list, {name}, {accept_encoding}': (
+                        lambda: jsonify(accounts),
+                        lambda: serialize.json_response(payload)),
+                }
+                for case, (before, after) in cases.items():
+                    before_ms = time_call(before, args.number)
+                    after_ms = time_call(after, args.number)
+                    print(f"{case:<34}{before_ms:>14.2f}{after_ms:>12.2f}{before_ms / after_ms:>9.1f}x")
+    print('(jsonify responses are never compressed; the gzip rows include compression time for the new layer)')
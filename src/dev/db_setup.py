@@ -1,9 +1,28 @@
 
+from itertools import islice
 from typing import NoReturn
+from typing import Optional
+from typing import Iterator
+from typing import Tuple
+from typing import Dict
+from typing import List
+import argparse
 import sqlite3
 import logging
+import time
+import json
 import csv
 import sys
+import os
+
+# Shard naming and hashing are shared with the app, which reads the shards; shard_layout only
+# needs the standard library, so none of the app's other modules are imported
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from shard_layout import read_manifest
+from shard_layout import manifest_path
+from shard_layout import shard_for_id
+from shard_layout import shard_path
+from shard_layout import shard_key
 
 
 # Setup logging
@@ -15,25 +34,176 @@ logging.basicConfig(level=logging.getLevelName('INFO'),
 # Static variables
 DATABASE_PATH = './data/sales.db'
 CSV_PATH = './data/sales.csv'
+ACCOUNT_COLUMNS = ('id', 'name', 'industry', 'region', 'status')
+
+# Bulk load settings
+BULK_CHUNK_SIZE = 10000  # Rows per executemany call
+BULK_COMMIT_EVERY = 500000  # Rows per transaction
+BULK_LOAD_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA cache_size = -262144',  # 256 MiB
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Sharded load settings
+DEFAULT_SHARDS = 4  # Database files when sharding by a hash of id
+
+def create_search_index(c: sqlite3.Cursor) -> NoReturn:
+    """
+    Creates the FTS5 trigram index 'accounts_fts' over accounts.name, plus the triggers that keep it in sync.
+    The index is external-content, so it stores only trigrams and points back to accounts by rowid;
+    it serves case-insensitive substring (LIKE '%q%') searches without scanning the table.
+    """
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS accounts_fts USING fts5(
+            name,
+            content='accounts',
+            content_rowid='rowid',
+            tokenize='trigram'
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_fts_insert AFTER INSERT ON accounts BEGIN
+            INSERT INTO accounts_fts (rowid, name) VALUES (new.rowid, new.name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_fts_delete AFTER DELETE ON accounts BEGIN
+            INSERT INTO accounts_fts (accounts_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_fts_update AFTER UPDATE OF name ON accounts BEGIN
+            INSERT INTO accounts_fts (accounts_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+            INSERT INTO accounts_fts (rowid, name) VALUES (new.rowid, new.name);
+        END
+    ''')
+
+def create_summary_tables(c: sqlite3.Cursor) -> NoReturn:
+    """
+    Creates 'account_counts', the number of accounts for every (industry, region, status) combination,
+    plus the triggers that keep it up to date as accounts change. Any grouped count over a subset of
+    those columns is a sum over this small table, whatever the size of 'accounts'.
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS account_counts (
+            industry TEXT NOT NULL,
+            region TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (industry, region, status)
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS account_counts_insert AFTER INSERT ON accounts BEGIN
+            INSERT INTO account_counts (industry, region, status, count)
+            VALUES (new.industry, new.region, new.status, 1)
+            ON CONFLICT (industry, region, status) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS account_counts_delete AFTER DELETE ON accounts BEGIN
+            UPDATE account_counts SET count = count - 1
+            WHERE industry = old.industry AND region = old.region AND status = old.status;
+            DELETE FROM account_counts
+            WHERE industry = old.industry AND region = old.region AND status = old.status AND count <= 0;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS account_counts_update AFTER UPDATE OF industry, region, status ON accounts BEGIN
+            UPDATE account_counts SET count = count - 1
+            WHERE industry = old.industry AND region = old.region AND status = old.status;
+            DELETE FROM account_counts
+            WHERE industry = old.industry AND region = old.region AND status = old.status AND count <= 0;
+            INSERT INTO account_counts (industry, region, status, count)
+            VALUES (new.industry, new.region, new.status, 1)
+            ON CONFLICT (industry, region, status) DO UPDATE SET count = count + 1;
+        END
+    ''')
+
+def rebuild_summary_tables(c: sqlite3.Cursor) -> NoReturn:
+    """
+    Recomputes 'account_counts' from scratch with a single GROUP BY over 'accounts'.
+    """
+    c.execute('DELETE FROM account_counts')
+    c.execute('''
+        INSERT INTO account_counts (industry, region, status, count)
+        SELECT industry, region, status, COUNT(*) FROM accounts GROUP BY industry, region, status
+    ''')
+
+def drop_summary_tables(c: sqlite3.Cursor) -> NoReturn:
+    """
+    Drops 'account_counts' and its triggers, so a bulk load does not update it row by row.
+    """
+    c.execute('DROP TRIGGER IF EXISTS account_counts_insert')
+    c.execute('DROP TRIGGER IF EXISTS account_counts_delete')
+    c.execute('DROP TRIGGER IF EXISTS account_counts_update')
+    c.execute('DROP TABLE IF EXISTS account_counts')
+
+def drop_search_index(c: sqlite3.Cursor) -> NoReturn:
+    """
+    Drops the 'accounts_fts' index and its sync triggers, so a bulk load does not update it row by row.
+    """
+    c.execute('DROP TRIGGER IF EXISTS accounts_fts_insert')
+    c.execute('DROP TRIGGER IF EXISTS accounts_fts_delete')
+    c.execute('DROP TRIGGER IF EXISTS accounts_fts_update')
+    c.execute('DROP TABLE IF EXISTS accounts_fts')
+
+def create_accounts_table(c: sqlite3.Cursor) -> NoReturn:
+    """
+    Creates the 'accounts' table, its name search index and its summary tables if they do not exist yet.
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            industry TEXT NOT NULL,
+            region TEXT NOT NULL,
+            status TEXT NOT NULL
+        )
+    ''')
+    create_search_index(c)
+    create_summary_tables(c)
+
+def read_csv_chunks(csv_path: str, chunk_size: int) -> Iterator[List[Tuple[str, ...]]]:
+    """
+    Streams a CSV export as lists of at most chunk_size (id, name, industry, region, status) tuples.
+    Blank lines are skipped. Raises ValueError if the CSV does not have all the account columns or
+    a row is missing some of its fields.
+    """
+    with open(csv_path, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, [])
+        missing = [column for column in ACCOUNT_COLUMNS if column not in header]
+        if missing:
+            raise ValueError(f"'{csv_path}' is missing the columns {', '.join(missing)}")
+        positions = [header.index(column) for column in ACCOUNT_COLUMNS]
+        width = max(positions) + 1
+        while True:
+            chunk = []
+            for row in islice(reader, chunk_size):
+                if len(row) < width:
+                    if not row:
+                        continue
+                    raise ValueError(f"'{csv_path}' line {reader.line_num} has {len(row)} fields, expected {len(header)}")
+                chunk.append(tuple(row[i] for i in positions))
+            if not chunk:
+                return
+            yield chunk
 
 def init_db() -> NoReturn:
     """
     Initializes the database by connecting to the SQLite database and creating a new table 'accounts'.
-    It will drop the existing table if it exists and then create a new one.
+    It will drop the existing table if it exists and then create a new one, along with its name search index.
     """
     try:
         conn = sqlite3.connect(DATABASE_PATH)
         c = conn.cursor()
+        c.execute('DROP TABLE IF EXISTS accounts_fts')  # Drops the search index along with the table
+        c.execute('DROP TABLE IF EXISTS account_counts')  # Drops the summary table along with the table
         c.execute('DROP TABLE IF EXISTS accounts')  # Drops the existing table if it exists
-        c.execute('''
-            CREATE TABLE accounts (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                industry TEXT NOT NULL,
-                region TEXT NOT NULL,
-                status TEXT NOT NULL
-            )
-        ''')
+        create_accounts_table(c)
         conn.commit()
         logger.info("Database initialized and table 'accounts' created successfully.")
     except sqlite3.Error as e:
@@ -63,7 +233,302 @@ def populate_db_from_csv() -> NoReturn:
     finally:
         conn.close()
 
+def bulk_load_from_csv(csv_path: str = CSV_PATH, chunk_size: int = BULK_CHUNK_SIZE,
+                       commit_every: int = BULK_COMMIT_EVERY) -> NoReturn:
+    """
+    Loads a large CSV export into the 'accounts' table as fast as SQLite allows.
+    The CSV is streamed in chunks through executemany inside large transactions, with WAL journaling,
+    synchronous=OFF and a large page cache for the duration of the load. The name search index
+    and summary tables are dropped first and rebuilt in one pass at the end, and rows/sec progress is logged
+    after every transaction.
+    """
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)  # Transactions are managed explicitly
+    try:
+        c = conn.cursor()
+        for pragma in BULK_LOAD_PRAGMAS:
+            c.execute(pragma)
+        drop_search_index(c)
+        drop_summary_tables(c)
+        insert = f'INSERT INTO accounts ({", ".join(ACCOUNT_COLUMNS)}) VALUES (?, ?, ?, ?, ?)'
+        start = time.perf_counter()
+        loaded = pending = 0
+        c.execute('BEGIN')
+        for chunk in read_csv_chunks(csv_path, chunk_size):
+            c.executemany(insert, chunk)
+            loaded += len(chunk)
+            pending += len(chunk)
+            if pending >= commit_every:
+                c.execute('COMMIT')
+                c.execute('BEGIN')
+                pending = 0
+                elapsed = time.perf_counter() - start
+                logger.info(f"Loaded {loaded:,} rows ({loaded / elapsed:,.0f} rows/sec).")
+        c.execute('COMMIT')
+        elapsed = time.perf_counter() - start
+        logger.info(f"Loaded {loaded:,} rows in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):,.0f} rows/sec).")
+
+        logger.info("Building the name search index and summary tables.")
+        c.execute('BEGIN')
+        create_search_index(c)
+        c.execute("INSERT INTO accounts_fts (accounts_fts) VALUES ('rebuild')")
+        create_summary_tables(c)
+        rebuild_summary_tables(c)
+        c.execute('COMMIT')
+        c.execute('ANALYZE')
+        # Back to a rollback journal so read-only servers need no -wal/-shm files next to the database
+        c.execute('PRAGMA journal_mode = DELETE')
+        logger.info(f"Bulk load finished in {time.perf_counter() - start:.1f}s.")
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        logger.error(f"An error occurred while bulk loading the database from CSV: {e}")
+    except ValueError as e:
+        if conn.in_transaction:
+            conn.rollback()
+        logger.error(f"An error occurred while reading the CSV: {e}")
+    except FileNotFoundError:
+        logger.error(f"The file '{csv_path}' was not found.")
+    finally:
+        conn.close()
+
+def sync_from_csv(csv_path: str = CSV_PATH, chunk_size: int = BULK_CHUNK_SIZE,
+                  allow_empty: bool = False) -> Dict[str, int]:
+    """
+    Incrementally brings the 'accounts' table in line with a CSV export instead of rebuilding it.
+    The CSV is staged in a temporary table and diffed against 'accounts' on id; only the inserted,
+    changed and deleted rows are written, in a single transaction, so readers never see an empty
+    table and nothing is rewritten when the export is unchanged. The search index and summary
+    tables follow through their triggers. Returns the number of rows inserted, updated and deleted.
+    An export without rows (e.g. a truncated file with only its header) would delete every account,
+    so it raises ValueError unless allow_empty is set. Any failure, including a duplicate id in the
+    CSV, is logged, rolled back and re-raised.
+    """
+    changes = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)  # Transactions are managed explicitly
+    try:
+        c = conn.cursor()
+        start = time.perf_counter()
+        c.execute('BEGIN')
+        existing = {row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        create_accounts_table(c)
+        # Databases built before the search index or summary tables existed get them backfilled once
+        if 'accounts_fts' not in existing:
+            c.execute("INSERT INTO accounts_fts (accounts_fts) VALUES ('rebuild')")
+        if 'account_counts' not in existing:
+            rebuild_summary_tables(c)
+        c.execute('''
+            CREATE TEMP TABLE incoming (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                industry TEXT NOT NULL,
+                region TEXT NOT NULL,
+                status TEXT NOT NULL
+            )
+        ''')
+        staged = 0
+        for chunk in read_csv_chunks(csv_path, chunk_size):
+            try:
+                c.executemany('INSERT INTO temp.incoming VALUES (?, ?, ?, ?, ?)', chunk)
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"'{csv_path}' lists an account id more than once ({e})")
+            staged += len(chunk)
+        if not staged and not allow_empty:
+            raise ValueError(f"'{csv_path}' has no rows, so syncing would delete every account")
+
+        c.execute('DELETE FROM accounts WHERE id NOT IN (SELECT id FROM temp.incoming)')
+        changes['deleted'] = c.rowcount
+        c.execute('''
+            UPDATE accounts
+            SET name = i.name, industry = i.industry, region = i.region, status = i.status
+            FROM temp.incoming AS i
+            WHERE accounts.id = i.id
+              AND (accounts.name IS NOT i.name OR accounts.industry IS NOT i.industry
+                   OR accounts.region IS NOT i.region OR accounts.status IS NOT i.status)
+        ''')
+        changes['updated'] = c.rowcount
+        c.execute('''
+            INSERT INTO accounts (id, name, industry, region, status)
+            SELECT i.id, i.name, i.industry, i.region, i.status
+            FROM temp.incoming AS i
+            WHERE NOT EXISTS (SELECT 1 FROM accounts AS a WHERE a.id = i.id)
+        ''')
+        changes['inserted'] = c.rowcount
+        c.execute('DROP TABLE temp.incoming')
+        c.execute('COMMIT')
+        logger.info(f"Synced {staged:,} CSV rows in {time.perf_counter() - start:.1f}s: "
+                    f"{changes['inserted']:,} inserted, {changes['updated']:,} updated, {changes['deleted']:,} deleted.")
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        logger.error(f"An error occurred while syncing the database from CSV: {e}")
+        raise
+    except ValueError as e:
+        if conn.in_transaction:
+            conn.rollback()
+        logger.error(f"An error occurred while reading the CSV: {e}")
+        raise
+    except FileNotFoundError:
+        if conn.in_transaction:
+            conn.rollback()
+        logger.error(f"The file '{csv_path}' was not found.")
+        raise
+    finally:
+        conn.close()
+    return changes
+
+
+def shard_from_csv(csv_path: str = CSV_PATH, shards: int = DEFAULT_SHARDS, shard_by: str = 'hash',
+                   chunk_size: int = BULK_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Partitions a CSV export into several database files instead of one 'accounts' table.
+    With shard_by='hash' there are `shards` files and each account goes to shard crc32(id) % shards;
+    with shard_by='region' there is one file per distinct region. Every shard is bulk loaded like
+    bulk_load_from_csv, with its own search index and summary tables, and a JSON manifest listing
+    the shards is written next to DATABASE_PATH last, so the app only ever sees complete shard sets.
+    Each run writes a new generation of shard files alongside the live ones, which are never touched:
+    replacing the manifest is the only step that switches to the new shards, and servers keep reading
+    the previous generation until they are restarted on the new manifest.
+    Returns the number of rows written to each shard file.
+    """
+    if shard_by == 'hash' and shards < 1:
+        raise ValueError('shards must be at least 1')
+    manifest = manifest_path(DATABASE_PATH)
+    generation = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    committed = False
+    conns: Dict[object, sqlite3.Connection] = {}
+    entries: Dict[object, Dict[str, str]] = {}
+    counts: Dict[str, int] = {}
+    insert = f'INSERT INTO accounts ({", ".join(ACCOUNT_COLUMNS)}) VALUES (?, ?, ?, ?, ?)'
+
+    def open_shard(key: object, region: Optional[str] = None) -> sqlite3.Connection:
+        path = shard_path(DATABASE_PATH, f'{key}-{generation}')
+        conn = sqlite3.connect(path, isolation_level=None)  # Transactions are managed explicitly
+        c = conn.cursor()
+        for pragma in BULK_LOAD_PRAGMAS:
+            c.execute(pragma)
+        create_accounts_table(c)
+        drop_search_index(c)
+        drop_summary_tables(c)
+        c.execute('BEGIN')
+        conns[key] = conn
+        entries[key] = {'path': os.path.basename(path), **({'region': region} if region else {})}
+        counts[os.path.basename(path)] = 0
+        return conn
+
+    try:
+        start = time.perf_counter()
+        if shard_by == 'hash':
+            for key in range(shards):
+                open_shard(key)
+        loaded = pending = 0
+        for chunk in read_csv_chunks(csv_path, chunk_size):
+            parts: Dict[object, List[Tuple[str, ...]]] = {}
+            for row in chunk:
+                key = shard_for_id(row[0], shards) if shard_by == 'hash' else shard_key(row[3])
+                parts.setdefault(key, []).append(row)
+            for key, rows in parts.items():
+                conn = conns.get(key) or open_shard(key, rows[0][3])
+                conn.executemany(insert, rows)
+                counts[entries[key]['path']] += len(rows)
+            loaded += len(chunk)
+            pending += len(chunk)
+            if pending >= BULK_COMMIT_EVERY:
+                for conn in conns.values():
+                    conn.execute('COMMIT')
+                    conn.execute('BEGIN')
+                pending = 0
+                elapsed = time.perf_counter() - start
+                logger.info(f"Loaded {loaded:,} rows ({loaded / elapsed:,.0f} rows/sec).")
+        elapsed = time.perf_counter() - start
+        logger.info(f"Loaded {loaded:,} rows into {len(conns)} shards in {elapsed:.1f}s "
+                    f"({loaded / max(elapsed, 1e-9):,.0f} rows/sec).")
+
+        logger.info("Building the name search index and summary tables of every shard.")
+        for conn in conns.values():
+            c = conn.cursor()
+            create_search_index(c)
+            c.execute("INSERT INTO accounts_fts (accounts_fts) VALUES ('rebuild')")
+            create_summary_tables(c)
+            rebuild_summary_tables(c)
+            c.execute('COMMIT')
+            c.execute('ANALYZE')
+            c.execute('PRAGMA journal_mode = DELETE')
+        keys = range(shards) if shard_by == 'hash' else sorted(entries)
+        with open(f'{manifest}.tmp', 'w') as f:
+            json.dump({'shard_by': shard_by, 'shards': [entries[key] for key in keys]}, f, indent=2)
+        try:
+            previous = read_manifest(manifest)['shards']
+        except (OSError, ValueError):
+            previous = []
+        os.replace(f'{manifest}.tmp', manifest)
+        committed = True
+        if previous:
+            logger.info(f"Previous shard files can be removed once no server reads them: "
+                        f"{', '.join(shard['path'] for shard in previous)}")
+        logger.info(f"Sharded load finished in {time.perf_counter() - start:.1f}s; manifest written to '{manifest}'.")
+    except sqlite3.Error as e:
+        logger.error(f"An error occurred while loading the shards from CSV: {e}")
+    except ValueError as e:
+        logger.error(f"An error occurred while reading the CSV: {e}")
+    except FileNotFoundError:
+        logger.error(f"The file '{csv_path}' was not found.")
+    finally:
+        for conn in conns.values():
+            if conn.in_transaction:
+                conn.rollback()
+            conn.close()
+        if not committed:
+            # The manifest still names the previous generation, so the partial one is unused
+            for entry in entries.values():
+                path = os.path.join(os.path.dirname(DATABASE_PATH), entry['path'])
+                for leftover in (path, f'{path}-journal', f'{path}-wal', f'{path}-shm'):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+    return counts
+
+
+def positive_int(text: str) -> int:
+    """
+    argparse type for counts that must be at least 1.
+    """
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, got {value}')
+    return value
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create and populate the sales database from a CSV export.')
+    parser.add_argument('--csv', default=CSV_PATH, help='CSV file to load (default: %(default)s)')
+    parser.add_argument('--db', default=DATABASE_PATH, help='SQLite database to create (default: %(default)s)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--bulk', action='store_true',
+                      help='Stream the CSV in large batched transactions; use for multi-million-row exports')
+    mode.add_argument('--sync', action='store_true',
+                      help='Apply only the inserts, updates and deletes needed to match the CSV, without a rebuild')
+    mode.add_argument('--shards', type=positive_int, metavar='N',
+                      help='Partition the accounts into N database files by a hash of id, plus a manifest')
+    mode.add_argument('--shard-by-region', action='store_true',
+                      help='Partition the accounts into one database file per region, plus a manifest')
+    parser.add_argument('--allow-empty', action='store_true',
+                        help='In sync mode, apply a CSV without rows, deleting every account')
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE,
+                        help='Rows per executemany call in bulk and sync modes (default: %(default)s)')
+    args = parser.parse_args()
+
+    DATABASE_PATH = args.db
+    CSV_PATH = args.csv
+    if args.sync:
+        try:
+            sync_from_csv(args.csv, args.chunk_size, args.allow_empty)
+        except (sqlite3.Error, ValueError, FileNotFoundError):
+            sys.exit(1)  # Already logged; the database is unchanged
+        sys.exit(0)
+    if args.shards or args.shard_by_region:
+        shard_from_csv(args.csv, args.shards or 0, 'region' if args.shard_by_region else 'hash', args.chunk_size)
+        sys.exit(0)
     init_db()
-    populate_db_from_csv()
+    if args.bulk:
+        bulk_load_from_csv(args.csv, args.chunk_size)
+    else:
+        populate_db_from_csv()
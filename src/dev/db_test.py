@@ -3,6 +3,11 @@ from typing import Dict
 import logging
 import sqlite3
 import sys
+import os
+
+# Share the fuzzy name index with the Cloud Function in src/app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from fuzzy import FuzzyNameIndex
 
 
 # Setup logging
@@ -62,6 +67,20 @@ def test_query_by_name_fuzzy(name: str) -> List[Dict]:
     finally:
         conn.close()
 
+def test_query_by_name_ranked(name: str, limit: int = 5) -> List[Dict]:
+    """
+    Builds the in-memory fuzzy name index and returns the accounts whose names are closest to the
+    (possibly misspelled) search term, best first, each with a similarity score.
+    """
+    try:
+        conn = connect_db()
+        c = conn.cursor()
+        c.execute('SELECT * FROM accounts')
+        index = FuzzyNameIndex(dict(result) for result in c.fetchall())
+        return index.search(name, limit)
+    finally:
+        conn.close()
+
 def test_query_by_industry(industry: str) -> List[Dict]:
     """
     Queries the database for accounts in a specific industry and returns the results as a list of dictionaries.
@@ -119,6 +138,12 @@ if __name__ == '__main__':
             print(f"{k}: {v}")
         print() 
 
+    print("Testing retrieval by Name (Ranked Fuzzy):")
+    for record in test_query_by_name_ranked('Kilo Helth'):
+        for k, v in record.items():
+            print(f"{k}: {v}")
+        print() 
+
     print("Testing by Industry:")
     for record in test_query_by_industry('Healthcare'):
         for k, v in record.items():
@@ -0,0 +1,179 @@
+from multiprocessing import Pool
+from collections import deque
+from typing import Optional
+from typing import Tuple
+from typing import Dict
+from typing import List
+import argparse
+import random
+import time
+import sys
+import os
+
+
+# Column distributions, in the proportions found in data/sales.csv
+INDUSTRIES = {'Technology': 18, 'Healthcare': 16, 'Retail': 16}
+REGIONS = {'North America': 18, 'Europe': 16, 'Asia': 16}
+STATUSES = {'Active': 34, 'Inactive': 16}
+
+# Name vocabulary in the style of data/sales.csv ("Omega Health Systems", "Bob LLC", ...)
+PREFIXES = [
+    'Alpha', 'Beta', 'Gamma', 'Delta', 'Epsilon', 'Zeta', 'Eta', 'Theta', 'Iota', 'Kappa', 'Lambda', 'Mu',
+    'Nu', 'Xi', 'Omicron', 'Pi', 'Rho', 'Sigma', 'Tau', 'Upsilon', 'Phi', 'Chi', 'Psi', 'Omega', 'Alice',
+    'Bob', 'Charlie', 'Echo', 'Foxtrot', 'Golf', 'Hotel', 'India', 'Juliet', 'Kilo', 'Lima', 'Mike',
+    'November', 'Oscar', 'Papa', 'Quebec', 'Romeo', 'Sierra', 'Tango', 'Uniform', 'Victor', 'Whiskey',
+    'Yankee', 'Zulu', 'Apex', 'Summit', 'Harbor', 'Cedar', 'Granite', 'Meridian', 'Northstar', 'Pioneer',
+    'Redwood', 'Silver', 'Vertex', 'Atlas',
+]
+DESCRIPTORS = [
+    'Global', 'Advanced', 'Integrated', 'United', 'Digital', 'Pacific', 'Atlantic', 'Premier', 'Modern',
+    'Smart', 'First', 'Prime', 'Bright', 'Blue', 'Green', 'Quantum', 'Dynamic', 'Strategic', 'Applied',
+    'National', 'Metro', 'Coastal', 'Continental', 'Next', 'Core', 'Direct', 'Allied', 'Trusted',
+]
+NOUNS = {
+    'Technology': ['Tech', 'Software', 'Systems', 'Networks', 'Networking', 'Electronics', 'Innovations',
+                   'Technologies', 'Solutions', 'Labs', 'Data', 'Cloud', 'Computing', 'Analytics', 'Solar'],
+    'Healthcare': ['Health', 'Healthcare', 'Pharma', 'Pharmaceuticals', 'Medical', 'Wellness', 'Care',
+                   'Health Systems', 'Clinics', 'Biotech', 'Diagnostics', 'Therapeutics', 'Life Sciences'],
+    'Retail': ['Retail', 'Stores', 'Goods', 'Consumer Goods', 'Marketplace', 'Wholesale', 'Retailers',
+               'Commerce', 'Provisions', 'Distribution', 'Outlets', 'Supply', 'Trading', 'Market'],
+}
+SUFFIXES = ['Inc', 'LLC', 'Corp', 'Group', 'Ltd', 'Co', 'Partners', 'Holdings']
+
+# Name shapes: (weight, uses descriptor, uses industry noun, uses suffix)
+NAME_SHAPES = [(40, False, True, False), (25, True, True, False), (20, False, True, True), (15, False, False, True)]
+
+# Rows generated per task; each block has its own seeded generator, so the output
+# does not depend on how many processes produced it
+DEFAULT_BLOCK_SIZE = 100000
+
+# Account IDs are 6 base-36 characters, like those in data/sales.csv
+ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+ID_LENGTH = 6
+ID_SPACE = len(ID_ALPHABET) ** ID_LENGTH
+
+# Multiplier of the row number -> ID bijection; coprime with ID_SPACE (36**6), so IDs never repeat
+ID_MULTIPLIER = 1_500_450_271
+
+
+def _cum_weights(weights: List[float]) -> List[float]:
+    total, cumulative = 0.0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _zipf_weights(count: int, exponent: float = 0.8) -> List[float]:
+    """
+    Skewed weights so a few name prefixes are common and most are rare, as with real company names.
+    """
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def account_id(row: int, offset: int) -> str:
+    """
+    Maps a row number to a unique, random-looking 6-character ID.
+    """
+    n = (row * ID_MULTIPLIER + offset) % ID_SPACE
+    chars = []
+    for _ in range(ID_LENGTH):
+        n, digit = divmod(n, 36)
+        chars.append(ID_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def generate_block(seed: int, block: int, start: int, stop: int) -> bytes:
+    """
+    Generates rows [start, stop) as CSV lines.
+
+    Args:
+        seed (int): Dataset seed.
+        block (int): Block number, which seeds this block's generator together with `seed`.
+        start (int): First row number.
+        stop (int): Row number after the last row.
+
+    Returns:
+        bytes: The CSV lines, without a header.
+    """
+    rng = random.Random(f'{seed}:{block}')
+    offset = random.Random(seed).randrange(ID_SPACE)
+    count = stop - start
+    industries = rng.choices(list(INDUSTRIES), cum_weights=_cum_weights(list(INDUSTRIES.values())), k=count)
+    regions = rng.choices(list(REGIONS), cum_weights=_cum_weights(list(REGIONS.values())), k=count)
+    statuses = rng.choices(list(STATUSES), cum_weights=_cum_weights(list(STATUSES.values())), k=count)
+    prefixes = rng.choices(PREFIXES, cum_weights=_cum_weights(_zipf_weights(len(PREFIXES))), k=count)
+    shapes = rng.choices(NAME_SHAPES, cum_weights=_cum_weights([shape[0] for shape in NAME_SHAPES]), k=count)
+    lines = []
+    for i in range(count):
+        industry = industries[i]
+        _, descriptor, noun, suffix = shapes[i]
+        parts = [prefixes[i]]
+        if descriptor:
+            parts.append(rng.choice(DESCRIPTORS))
+        if noun:
+            parts.append(rng.choice(NOUNS[industry]))
+        if suffix:
+            parts.append(rng.choice(SUFFIXES))
+        lines.append(f"{account_id(start + i, offset)},{' '.join(parts)},{industry},{regions[i]},{statuses[i]}\n")
+    return ''.join(lines).encode()
+
+
+def _generate_block(args: Tuple[int, int, int, int]) -> bytes:
+    return generate_block(*args)
+
+
+def generate_csv(output: str, rows: int, seed: int = 0, processes: Optional[int] = None,
+                 block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[str, float]:
+    """
+    Writes a synthetic accounts CSV with the same columns as data/sales.csv.
+
+    Blocks are generated in parallel and written in order. At most two blocks per
+    process are in flight, so memory stays constant whatever the row count.
+
+    Args:
+        output (str): CSV path to write, or '-' for stdout.
+        rows (int): Number of accounts.
+        seed (int): Seed; the same seed and row count always give the same file.
+        processes (Optional[int]): Worker processes; defaults to the CPU count.
+        block_size (int): Rows per block.
+
+    Returns:
+        Dict[str, float]: The rows written, seconds taken and rows per second.
+    """
+    if not 0 <= rows <= ID_SPACE:
+        raise ValueError(f'rows must be between 0 and {ID_SPACE}')
+    processes = processes or os.cpu_count() or 1
+    tasks = ((seed, block, start, min(start + block_size, rows))
+             for block, start in enumerate(range(0, rows, block_size)))
+    started = time.perf_counter()
+    out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+    try:
+        out.write(b'id,name,industry,region,status\n')
+        with Pool(processes) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_generate_block, (task,)))
+                if len(pending) >= 2 * processes:
+                    out.write(pending.popleft().get())
+            while pending:
+                out.write(pending.popleft().get())
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    elapsed = time.perf_counter() - started
+    return {'rows': rows, 'seconds': round(elapsed, 3), 'rows_per_second': round(rows / elapsed) if elapsed else 0}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a large synthetic sales.csv for scaling tests.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Number of accounts (default: %(default)s)')
+    parser.add_argument('--output', default='data/sales_large.csv', help="CSV to write, or '-' for stdout (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help='Seed for reproducible output (default: %(default)s)')
+    parser.add_argument('--processes', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE, help='Rows per block (default: %(default)s)')
+    args = parser.parse_args()
+
+    stats = generate_csv(args.output, args.rows, args.seed, args.processes, args.block_size)
+    print(f"Wrote {stats['rows']} accounts to {args.output} in {stats['seconds']} s "
+          f"({stats['rows_per_second']} rows/s)", file=sys.stderr)
@@ -0,0 +1,297 @@
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+import collections
+import itertools
+import threading
+import argparse
+import datetime
+import requests
+import platform
+import logging
+import random
+import json
+import time
+import sys
+import os
+
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+# Default request mix: route name -> relative weight
+DEFAULT_MIX = {'get_account': 5, 'search_accounts': 3, 'get_accounts': 1, 'generate_account_url': 1}
+
+# Accounts sampled from the target to build realistic IDs and search terms
+SAMPLE_SIZE = 1000
+
+PERCENTILES = (50, 95, 99)
+
+# (method, path, JSON body)
+Call = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+class InProcessTarget:
+    """
+    Sends requests straight to the Flask app in main.py, without a network or server in between.
+    """
+
+    def __init__(self) -> None:
+        os.chdir(APP_DIR)
+        sys.path.append(APP_DIR)
+        import main
+        # Keep log formatting in the measurement but send the output nowhere
+        logging.getLogger().handlers = [logging.NullHandler()]
+        self.app = main.app
+        self._local = threading.local()
+
+    def send(self, method: str, path: str, body: Optional[Dict[str, Any]]) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HttpTarget:
+    """
+    Sends requests to a running server over keep-alive connections.
+    """
+
+    def __init__(self, base_url: str, connections: int, timeout: float) -> None:
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def send(self, method: str, path: str, body: Optional[Dict[str, Any]]) -> int:
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', json=body, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            return 0
+        return response.status_code
+
+
+def sample_accounts(target: Any) -> List[Dict[str, Any]]:
+    """
+    Fetches up to SAMPLE_SIZE accounts from the target to draw request parameters from.
+    """
+    if isinstance(target, InProcessTarget):
+        return target.app.test_client().get(f'/api/accounts?limit={SAMPLE_SIZE}').get_json()
+    response = target.session.get(f'{target.base_url}/api/accounts', params={'limit': SAMPLE_SIZE}, timeout=target.timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def make_routes(accounts: List[Dict[str, Any]]) -> Dict[str, Callable[[random.Random], Call]]:
+    """
+    Builds a request generator per route, drawing IDs and names from `accounts`.
+    """
+    ids = [account['id'] for account in accounts] or ['UNKNOWN']
+    words = [word for account in accounts for word in account['name'].split() if len(word) > 2] or ['a']
+    return {
+        'get_accounts': lambda rng: ('GET', '/api/accounts', None),
+        'get_account': lambda rng: ('GET', f'/api/accounts/{rng.choice(ids)}', None),
+        'search_accounts': lambda rng: ('GET', f"/api/accounts/search?{urlencode({'name': rng.choice(words)})}", None),
+        'generate_account_url': lambda rng: ('POST', '/api/accounts/url', {
+            'account_id': rng.choice(ids), 'account_type': rng.choice(['portfolio', 'sales', 'activity'])}),
+    }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """
+    Parses a request mix such as 'get_account=5,search_accounts=3'.
+    """
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown routes {', '.join(sorted(unknown))}; choose from {', '.join(DEFAULT_MIX)}")
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """
+    Summarizes one route's latencies (seconds) into counts, throughput and percentiles in ms.
+    """
+    values = sorted(latencies)
+    summary = {
+        'requests': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+    for pct in PERCENTILES:
+        summary[f'p{pct}_ms'] = round(percentile(values, pct) * 1000, 3)
+    return summary
+
+
+def run(target: Any, mix: Dict[str, float], concurrency: int, duration: float,
+        rate: Optional[float] = None, total: Optional[int] = None, seed: int = 0) -> Dict[str, Any]:
+    """
+    Replays a weighted mix of requests against `target` and measures each one.
+
+    Without `rate`, `concurrency` workers send requests back to back (closed loop). With
+    `rate`, requests are scheduled at fixed arrival times (open loop) and latency is
+    measured from the scheduled time, so a server that falls behind shows its queueing
+    delay instead of silently slowing the load down.
+
+    Args:
+        target (Any): An InProcessTarget or HttpTarget.
+        mix (Dict[str, float]): Route name to relative weight.
+        concurrency (int): Worker threads.
+        duration (float): Seconds to run for.
+        rate (Optional[float]): Requests per second to schedule, or None for closed loop.
+        total (Optional[int]): Stop after this many requests, if reached before `duration`.
+        seed (int): Seed for the request sequence.
+
+    Returns:
+        Dict[str, Any]: Per-route and overall summaries, and the elapsed seconds.
+    """
+    routes = make_routes(sample_accounts(target))
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    for name in names:  # Warm every route once, outside the measurement
+        target.send(*routes[name](random.Random(seed)))
+
+    # Each worker records into its own slot, merged once every worker has finished
+    worker_latencies: List[Dict[str, List[float]]] = [collections.defaultdict(list) for _ in range(concurrency)]
+    worker_errors: List[Dict[str, int]] = [collections.defaultdict(int) for _ in range(concurrency)]
+    counter = itertools.count()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1_000_003 + worker_id)
+        latencies = worker_latencies[worker_id]
+        errors = worker_errors[worker_id]
+        while True:
+            i = next(counter)
+            if total is not None and i >= total:
+                return
+            if rate:
+                scheduled = started + i / rate
+                if scheduled >= deadline:
+                    return
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    return
+            name = rng.choices(names, weights)[0]
+            status = target.send(*routes[name](rng))
+            latency = time.perf_counter() - scheduled
+            latencies[name].append(latency)
+            if not 200 <= status < 400:
+                errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies: Dict[str, List[float]] = collections.defaultdict(list)
+    errors: Dict[str, int] = collections.defaultdict(int)
+    for recorded, failed in zip(worker_latencies, worker_errors):
+        for name, values in recorded.items():
+            latencies[name].extend(values)
+        for name, count in failed.items():
+            errors[name] += count
+
+    routes_summary = {name: summarize(latencies[name], errors[name], elapsed) for name in names if latencies[name]}
+    everything = [latency for name in names for latency in latencies[name]]
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'overall': summarize(everything, sum(errors.values()), elapsed),
+        'routes': routes_summary,
+    }
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Prints the per-route table, with the change against a baseline run if given.
+    """
+    header = f"{'route':<22}{'requests':>10}{'errors':>8}{'req/s':>10}" + ''.join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES)
+    if baseline:
+        header += f"{'p99 vs base':>13}"
+    print(header)
+    rows = [*results['routes'].items(), ('overall', results['overall'])]
+    for name, summary in rows:
+        line = f"{name:<22}{summary['requests']:>10}{summary['errors']:>8}{summary['throughput_rps']:>10.1f}"
+        line += ''.join(f"{summary[f'p{pct}_ms']:>10.2f}" for pct in PERCENTILES)
+        if baseline:
+            base = baseline['overall'] if name == 'overall' else baseline['routes'].get(name)
+            if base and base['p99_ms']:
+                line += f"{(summary['p99_ms'] / base['p99_ms'] - 1) * 100:>+12.1f}%"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the Sales API and report throughput and latency percentiles per route.')
+    parser.add_argument('--url', help='Base URL of a running server; omit to test the in-process app from main.py')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Weighted routes, e.g. get_account=5,search_accounts=3 (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent workers (default: %(default)s)')
+    parser.add_argument('--rate', type=float, help='Fixed arrival rate in requests/s (default: closed loop)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run (default: %(default)s)')
+    parser.add_argument('--requests', type=int, help='Stop after this many requests')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout for --url (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the request sequence (default: %(default)s)')
+    parser.add_argument('--label', default='', help='Free-form label stored with the results, e.g. the table size')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare p99 latency against')
+    args = parser.parse_args()
+    # The in-process target changes directory to src/app, so resolve file arguments first
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    target = HttpTarget(args.url, args.concurrency, args.timeout) if args.url else InProcessTarget()
+    results = run(target, args.mix, args.concurrency, args.duration, args.rate, args.requests, args.seed)
+    report = {
+        'label': args.label,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'config': {
+            'target': args.url or 'in-process',
+            'mix': args.mix,
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'duration': args.duration,
+            'requests': args.requests,
+            'seed': args.seed,
+        },
+        **results,
+    }
+    baseline = None
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Results written to {output}')
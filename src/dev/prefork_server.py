@@ -0,0 +1,287 @@
+from werkzeug.serving import WSGIRequestHandler
+from werkzeug.serving import BaseWSGIServer
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from typing import Dict
+import threading
+import argparse
+import logging
+import signal
+import socket
+import time
+import sys
+import gc
+import os
+
+
+# Serve the Cloud Function's app; it resolves sales.db relative to its own directory
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+os.chdir(APP_DIR)
+sys.path.append(APP_DIR)
+import main
+
+logger = logging.getLogger('prefork_server')
+
+# Server settings, overridable through the environment
+WORKERS = int(os.environ.get('SALES_WORKERS', str(os.cpu_count() or 1)))
+THREADS = int(os.environ.get('SALES_WORKER_THREADS', str(main.pool.size)))
+GRACEFUL_TIMEOUT = float(os.environ.get('SALES_GRACEFUL_TIMEOUT', '30'))
+KEEPALIVE_TIMEOUT = float(os.environ.get('SALES_KEEPALIVE_TIMEOUT', '5'))
+
+# Seconds between the master's checks for dead workers and a changed database
+MONITOR_INTERVAL = 0.5
+
+# Requests replayed in the master so the snapshot and every index built from it exist before forking
+PRELOAD_PATHS = [
+    '/api/accounts',
+    '/api/accounts?limit=1',
+    '/api/accounts/search?name=preload&mode=fuzzy',
+    '/api/accounts/filter?status=preload',
+]
+
+
+def preload() -> Optional[str]:
+    """
+    Loads the dataset in the master so forked workers share it copy-on-write.
+
+    The account snapshot, its derived indexes and the cached JSON payloads are built by
+    replaying PRELOAD_PATHS. Every SQLite handle is then closed, since connections must
+    not cross a fork; workers reopen their own on first use. Finally the heap is moved
+    into the GC's permanent generation, so collections in the workers never write to
+    (and so never copy) the shared pages.
+
+    Returns:
+        Optional[str]: The database version token the preloaded data belongs to.
+    """
+    gc.unfreeze()
+    client = main.app.test_client()
+    for path in PRELOAD_PATHS:
+        client.get(path, headers={'Accept-Encoding': 'gzip'})
+    token = main.versions.token()
+    main.pool.close()
+    main.versions.close()
+    if main.shards is not None:
+        main.shards.close()
+    gc.collect()
+    gc.freeze()
+    return token
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    HTTP/1.1 handler that closes idle keep-alive connections after KEEPALIVE_TIMEOUT seconds.
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug's WSGI server, handling connections on a fixed-size thread pool.
+
+    The listening socket is inherited from the master, so every worker accepts from
+    the same queue and the kernel spreads connections between them.
+    """
+    multithread = True
+
+    def __init__(self, listener: socket.socket, app, threads: int) -> None:
+        # Created first: the base constructor calls server_close() on its placeholder socket
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='sales-worker')
+        host, port = listener.getsockname()[:2]
+        super().__init__(host, port, app, handler=KeepAliveRequestHandler, fd=listener.fileno())
+
+    def process_request(self, request, client_address) -> None:
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self) -> None:
+        """
+        Waits for in-flight requests to finish, then closes the socket.
+        """
+        self.executor.shutdown(wait=True)
+        self.server_close()
+
+
+def serve_worker(listener: socket.socket, threads: int) -> int:
+    """
+    Runs one worker process until it is told to stop.
+
+    SIGTERM stops accepting new connections and exits once the in-flight requests
+    are done. The master sends SIGKILL if that takes longer than the graceful timeout.
+    """
+    server = PooledWSGIServer(listener, main.app, threads)
+
+    def stop(signum, frame) -> None:
+        # shutdown() waits for serve_forever() to return, so it cannot run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    logger.info(f'Worker {os.getpid()} serving with {threads} threads')
+    server.serve_forever()
+    server.drain()
+    logger.info(f'Worker {os.getpid()} stopped')
+    return 0
+
+
+class Master:
+    """
+    Pre-fork master: owns the listening socket and the preloaded dataset, and supervises the workers.
+
+    - SIGTERM / SIGINT: graceful shutdown of every worker.
+    - SIGHUP, or a new `sales.db` being deployed: zero-downtime reload. The master loads the
+      new data and forks a fresh set of workers onto the same socket before the old ones
+      are drained, so there is no moment without a worker accepting connections.
+    - A worker that dies unexpectedly is replaced.
+    """
+
+    def __init__(self, host: str, port: int, workers: int, threads: int, watch: bool = True) -> None:
+        """
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind.
+            workers (int): Number of worker processes.
+            threads (int): Request threads per worker.
+            watch (bool): Reload automatically when the database file changes.
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.watch = watch
+        self.listener: Optional[socket.socket] = None
+        self.active: Dict[int, int] = {}  # pid -> generation
+        self.retiring: Dict[int, float] = {}  # pid -> deadline for SIGKILL
+        self.generation = 0
+        self.token: Optional[str] = None
+        self._reload = False
+        self._stop = False
+
+    def spawn(self) -> int:
+        """
+        Forks one worker of the current generation.
+        """
+        # SQLite handles opened by the master since the last preload must not be inherited
+        main.pool.close()
+        main.versions.close()
+        if main.shards is not None:
+            main.shards.close()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = serve_worker(self.listener, self.threads)
+            except BaseException:
+                logger.exception(f'Worker {os.getpid()} crashed')
+            finally:
+                os._exit(code)
+        self.active[pid] = self.generation
+        return pid
+
+    def retire(self, pids) -> None:
+        """
+        Asks workers to finish their in-flight requests and exit.
+        """
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        for pid in pids:
+            self.active.pop(pid, None)
+            self.retiring[pid] = deadline
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload(self) -> None:
+        """
+        Loads the current database and replaces every worker without dropping connections.
+        """
+        old = list(self.active)
+        self.token = preload()
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn()
+        self.retire(old)
+        logger.info(f'Reloaded: generation {self.generation} serving database version {self.token}')
+
+    def reap(self) -> None:
+        """
+        Collects exited workers, replaces crashed ones and kills retiring ones past their deadline.
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            if self.active.pop(pid, None) is not None and not self._stop:
+                logger.warning(f'Worker {pid} exited unexpectedly ({status}), starting a replacement')
+                self.spawn()
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now >= deadline:
+                logger.warning(f'Worker {pid} did not stop within {GRACEFUL_TIMEOUT}s, killing it')
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.retiring[pid] = float('inf')
+
+    def run(self) -> None:
+        """
+        Binds the socket, preloads the data, forks the workers and supervises them until stopped.
+        """
+        self.listener = socket.create_server((self.host, self.port), backlog=2048)
+        self.listener.set_inheritable(True)
+        self.token = preload()
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info(f'Master {os.getpid()} listening on http://{self.host}:{self.port} '
+                    f'with {self.workers} workers x {self.threads} threads')
+
+        def request_stop(signum, frame) -> None:
+            self._stop = True
+
+        def request_reload(signum, frame) -> None:
+            self._reload = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGHUP, request_reload)
+
+        while not self._stop:
+            time.sleep(MONITOR_INTERVAL)
+            self.reap()
+            if self.watch and not self._reload:
+                self._reload = main.versions.token() != self.token
+            if self._reload and not self._stop:
+                self._reload = False
+                self.reload()
+
+        logger.info('Shutting down')
+        self.retire(list(self.active))
+        while self.retiring:
+            time.sleep(MONITOR_INTERVAL)
+            self.reap()
+        self.listener.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the Sales API with a pre-forked pool of worker processes.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=5000, help='Port to bind (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Worker processes (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=THREADS, help='Request threads per worker (default: %(default)s)')
+    parser.add_argument('--no-watch', action='store_true', help='Do not reload when sales.db changes; use SIGHUP instead')
+    args = parser.parse_args()
+    Master(args.host, args.port, args.workers, args.threads, watch=not args.no_watch).run()